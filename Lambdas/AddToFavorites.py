@@ -1,64 +1,57 @@
 import json
-import os
 import pymysql
-import logging
-
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-rds_host = os.environ['DB_HOST']
-name = os.environ['DB_USER']
-password = os.environ['DB_PASS']
-db_name = os.environ['DB_NAME']
+from db_connection import get_connection
+from session_tokens import check_session
+from fashpo import log_invocation, logger
 
+@log_invocation
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     item_id = body['itemId']  # changed from postId to item_id to be generic
     user_id = body['user_id']
     item_type = body.get('itemType', 'post')  # default to 'post' if itemType not provided
 
+    # Callers that logged in with a session token may only act as themselves
+    session_error = check_session(event, user_id)
+    if session_error:
+        return session_error
+
     try:
-        # Connect to the database using a with statement to ensure it's always closed
-        with pymysql.connect(host=rds_host, user=name, passwd=password, db=db_name, connect_timeout=5) as conn:
+        # Borrow the container's warm connection for this invocation
+        with get_connection() as conn:
             with conn.cursor() as cur:
-                # Determine the column to update based on item type
-                column_name = 'favorite_clothing' if item_type == 'clothing' else 'favorite_posts'
-                
-                # Fetch the current favorite items from the user
-                cur.execute(f"SELECT {column_name} FROM Users WHERE id = %s", (user_id,))
-                result = cur.fetchone()
-                if result:
-                    favorite_items = result[0] if result[0] else ""
-                    favorite_items_list = favorite_items.split(',') if favorite_items else []
-                    
-                    # Check if the item is already in the list and add/remove it
-                    if str(item_id) in favorite_items_list:
-                        favorite_items_list.remove(str(item_id))
+                # Favorites are keyed by item type so posts and clothing share one table
+                item_type = 'clothing' if item_type == 'clothing' else 'post'
+
+                cur.execute("SELECT 1 FROM Users WHERE id = %s", (user_id,))
+                if cur.fetchone():
+                    # Toggle: remove the favorite if it exists, otherwise add it
+                    removed = cur.execute(
+                        "DELETE FROM Favorites WHERE user_id = %s AND item_type = %s AND item_id = %s",
+                        (user_id, item_type, item_id))
+                    if removed:
                         action_message = f'Successfully removed from {item_type} favorites'
-                        logger.info(f"Item ID {item_id} removed from user {user_id}'s {item_type} favorites.")
+                        logger.info("Item ID %s removed from user %s's %s favorites.", item_id, user_id, item_type)
                     else:
-                        favorite_items_list.append(str(item_id))
+                        cur.execute(
+                            "INSERT IGNORE INTO Favorites (user_id, item_type, item_id) VALUES (%s, %s, %s)",
+                            (user_id, item_type, item_id))
                         action_message = f'Successfully added to {item_type} favorites'
-                        logger.info(f"Item ID {item_id} added to user {user_id}'s {item_type} favorites.")
-                    
-                    # Update the new list of favorite items in the database
-                    favorite_items = ','.join(favorite_items_list)
-                    cur.execute(f"UPDATE Users SET {column_name} = %s WHERE id = %s", (favorite_items, user_id))
+                        logger.info("Item ID %s added to user %s's %s favorites.", item_id, user_id, item_type)
                     conn.commit()
-                    
+
                     return {
                         'statusCode': 200,
                         'body': json.dumps(action_message)
                     }
                 else:
-                    logger.warning(f"User with ID {user_id} not found.")
+                    logger.warning("User with ID %s not found.", user_id)
                     return {
                         'statusCode': 404,
                         'body': json.dumps('User not found')
                     }
     except pymysql.MySQLError as e:
-        logger.error(f"Database error: {e}")
+        logger.error("Database error: %s", e)
         return {
             'statusCode': 500,
             'body': json.dumps('Database connection failed')
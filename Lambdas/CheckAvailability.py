@@ -1,30 +1,31 @@
 import json
 import pymysql
-import os
-import logging
-
-# Set up logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+import signup_filter
+from db_connection import get_connection
+from fashpo import log_invocation, logger
 
+@log_invocation
 def lambda_handler(event, context):
-    # Retrieve database credentials from environment variables
-    db_host = os.environ['DB_HOST']
-    db_name = os.environ['DB_NAME']
-    db_user = os.environ['DB_USER']
-    db_pass = os.environ['DB_PASS']
-
     try:
         # Parse the input data from the POST request
         data = json.loads(event['body'])
         input_username = data['username']
         
-        # Use a with statement to ensure the connection is closed after usage
-        with pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name, connect_timeout=5) as connection:
+        # Most names typed during signup are free; the filter answers those
+        # without MySQL and only possible matches are looked up
+        if not signup_filter.might_exist('username', input_username):
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Username does not exist'})
+            }
+
+        # Borrow the container's warm connection for this invocation
+        with get_connection() as connection:
             with connection.cursor() as cursor:
                 # Query to check if the username exists in the Users table
                 cursor.execute("SELECT EXISTS(SELECT 1 FROM Users WHERE username = %s)", (input_username,))
                 (exists,) = cursor.fetchone()
+                signup_filter.record_result(exists)
                 
                 # Determine if the username exists
                 message = 'Username exists' if exists else 'Username does not exist'
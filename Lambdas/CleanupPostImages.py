@@ -0,0 +1,72 @@
+import json
+from db_connection import get_connection
+from fashpo import client_error, log_invocation, logger
+from image_refs import is_referenced
+from post_uploads import sweep_expired_uploads
+from s3_images import bucket_name, get_s3_client
+
+# S3 DeleteObjects accepts at most 1000 keys per call
+DELETE_BATCH_SIZE = 1000
+
+def delete_images(post_id, image_keys):
+    deleted = 0
+    for start in range(0, len(image_keys), DELETE_BATCH_SIZE):
+        batch = image_keys[start:start + DELETE_BATCH_SIZE]
+        try:
+            response = get_s3_client().delete_objects(
+                Bucket=bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+        except client_error() as e:
+            logger.error("Failed to delete images for post %s: %s", post_id, e.response['Error'])
+            raise
+
+        errors = response.get('Errors', [])
+        if errors:
+            # Raising makes Lambda retry the whole event
+            logger.error("Failed to delete %s image(s) for post %s: %s", len(errors), post_id, json.dumps(errors))
+            raise RuntimeError(f"Could not delete all images for post {post_id}")
+        deleted += len(batch)
+
+    logger.info("Deleted %s image(s) for post %s", deleted, post_id)
+    return deleted
+
+# Invoked asynchronously by DeletePost with {"post_id": ..., "image_keys": [...]}
+# so removing the post's objects never adds to the delete request's latency.
+# Lambda retries failed async invocations, and deleting a missing key is a no-op.
+#
+# Content-addressed images (see image_refs) come with their content_hash and
+# are only deleted if no post has claimed the hash again in the meantime.
+#
+# An EventBridge schedule also invokes it to sweep upload slots from
+# RequestPostUpload that were never turned into a post.
+@log_invocation
+def lambda_handler(event, context):
+    if event.get('source') == 'aws.events':
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                swept = sweep_expired_uploads(cur)
+            conn.commit()
+        return {'swept_uploads': swept}
+
+    post_id = event.get('post_id')
+    image_keys = event.get('image_keys') or []
+    if not image_keys:
+        logger.info("No images to clean up for post %s", post_id)
+        return {'deleted': 0}
+
+    image_hash = event.get('content_hash')
+    if not image_hash:
+        return {'deleted': delete_images(post_id, image_keys)}
+
+    # The hash stays locked while its objects are deleted, so a repost of the
+    # photo waits and then uploads them again
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if is_referenced(cur, image_hash):
+                logger.info("Image %s is used by another post again, keeping it", image_hash)
+                return {'deleted': 0}
+            deleted = delete_images(post_id, image_keys)
+        conn.commit()
+    return {'deleted': deleted}
+
@@ -1,23 +1,16 @@
 import pymysql
 import json
-import os
-import logging
+from db_connection import get_connection
+from session_tokens import check_session
+from vote_log import read_tallies, record_vote
+from fashpo import log_invocation, logger
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-db_host = os.environ['DB_HOST']
-db_name = os.environ['DB_NAME']
-db_user = os.environ['DB_USER']
-db_pass = os.environ['DB_PASS']
-
-def calculate_percentage(up_votes, down_votes):
-    num_up_votes = len(up_votes) if up_votes else 0
-    num_down_votes = len(down_votes) if down_votes else 0
+def calculate_percentage(num_up_votes, num_down_votes):
     total_votes = num_up_votes + num_down_votes
     percentage_up_votes = (num_up_votes / total_votes * 100) if total_votes > 0 else 0
     return round(percentage_up_votes), total_votes
 
+@log_invocation
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     clothing_id = body['clothing_id']
@@ -25,51 +18,70 @@ def lambda_handler(event, context):
     action_type = body['action_type']  # 'add' or 'remove'
     user_id = str(body['user_id'])
 
+    # Callers that logged in with a session token may only act as themselves
+    session_error = check_session(event, user_id)
+    if session_error:
+        return session_error
+
     column_to_update = {
         'like': 'up_votes',
         'dislike': 'down_votes',
         'favorite': 'favorites'
     }.get(user_action, None)
 
+    if action_type not in ('add', 'remove'):
+        logger.error("Invalid action type: %s", action_type)
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid action type'})
+        }
+
     if column_to_update is None:
-        logger.error(f"Invalid user action: {user_action}")
+        logger.error("Invalid user action: %s", user_action)
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Invalid user action'})
         }
 
     try:
-        with pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name, connect_timeout=5) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cur:
-                # Retrieve the current lists from the database
-                cur.execute(f"SELECT up_votes, down_votes FROM ClothingArticles WHERE id = %s", (clothing_id,))
+                cur.execute("SELECT 1 FROM ClothingArticles WHERE id = %s", (clothing_id,))
                 result = cur.fetchone()
-                
-                if result:
-                    up_votes = result[0].split(',') if result[0] else []
-                    down_votes = result[1].split(',') if result[1] else []
 
-                    # Update the lists based on action
-                    if column_to_update == 'up_votes':
-                        if action_type == 'add' and user_id not in up_votes:
-                            up_votes.append(user_id)
-                        elif action_type == 'remove' and user_id in up_votes:
-                            up_votes.remove(user_id)
-                    elif column_to_update == 'down_votes':
-                        if action_type == 'add' and user_id not in down_votes:
-                            down_votes.append(user_id)
-                        elif action_type == 'remove' and user_id in down_votes:
-                            down_votes.remove(user_id)
-                    
-                    # Calculate new vote percentage and total votes
-                    updated_percentage, total_votes = calculate_percentage(up_votes, down_votes)
+                if result:
+                    # Favorites live with the user's other favorites; votes have their own table
+                    if column_to_update == 'favorites':
+                        if action_type == 'add':
+                            cur.execute("INSERT IGNORE INTO Favorites (user_id, item_type, item_id) VALUES (%s, 'clothing', %s)",
+                                        (user_id, clothing_id))
+                        else:
+                            cur.execute("DELETE FROM Favorites WHERE user_id = %s AND item_type = 'clothing' AND item_id = %s",
+                                        (user_id, clothing_id))
+                    else:
+                        vote_type = 'up' if column_to_update == 'up_votes' else 'down'
+                        if action_type == 'add':
+                            changed = cur.execute("INSERT IGNORE INTO ClothingVotes (clothing_id, user_id, vote_type) VALUES (%s, %s, %s)",
+                                                  (clothing_id, user_id, vote_type))
+                            delta = 1
+                        else:
+                            changed = cur.execute("DELETE FROM ClothingVotes WHERE clothing_id = %s AND user_id = %s AND vote_type = %s",
+                                                  (clothing_id, user_id, vote_type))
+                            delta = -1
+                        # Only log a tally change when the vote row actually changed, so a
+                        # repeated tap or a retried request cannot count twice. The vote
+                        # row's key lock serialises concurrent taps by the same user, and
+                        # the event is an insert, so other users' votes never wait on the
+                        # article's row; CompactVoteEvents folds it into the counters later.
+                        if changed:
+                            record_vote(cur, clothing_id, vote_type, delta)
 
-                    # Update the database
-                    updated_list = ','.join(up_votes if column_to_update == 'up_votes' else down_votes)
-                    cur.execute(f"UPDATE ClothingArticles SET {column_to_update} = %s WHERE id = %s", (updated_list, clothing_id))
+                    # Read back the exact tallies: counters plus events not yet compacted
+                    num_up_votes, num_down_votes = read_tallies(cur, clothing_id)
+                    updated_percentage, total_votes = calculate_percentage(num_up_votes, num_down_votes)
                     conn.commit()
                 else:
-                    logger.info(f"Clothing article with id {clothing_id} not found.")
+                    logger.info("Clothing article with id %s not found.", clothing_id)
                     return {
                         'statusCode': 404,
                         'body': json.dumps({'error': "Clothing article not found"})
@@ -83,7 +95,7 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Database update failed'})
         }
 
-    logger.info(f"Successfully updated {column_to_update} for clothing id {clothing_id}.")
+    logger.info("Successfully updated %s for clothing id %s.", column_to_update, clothing_id)
     return {
         'statusCode': 200,
         'body': json.dumps({
@@ -0,0 +1,36 @@
+import pymysql
+from db_connection import get_connection
+from vote_log import compact, compaction_batch_size
+from fashpo import add_summary_fields, log_invocation, logger
+
+# Stop starting new batches when less than this is left of the invocation
+TIME_MARGIN_MS = 10000
+
+# Run on an EventBridge schedule (every minute is plenty). Folds the
+# ClothingVoteEvents written by ClothingClick into the ClothingArticles
+# counters, one committed batch at a time, until the log is drained or the
+# invocation is nearly out of time; anything left waits for the next run and
+# is still counted by readers meanwhile.
+@log_invocation
+def lambda_handler(event, context):
+    folded = 0
+    batches = 0
+    try:
+        with get_connection() as conn:
+            while True:
+                with conn.cursor() as cur:
+                    count = compact(cur, compaction_batch_size)
+                conn.commit()
+                folded += count
+                batches += 1
+                if count < compaction_batch_size:
+                    break
+                if context is not None and context.get_remaining_time_in_millis() < TIME_MARGIN_MS:
+                    logger.info("Stopping compaction early, the vote log is not drained yet")
+                    break
+    except pymysql.MySQLError as e:
+        logger.error("Vote compaction failed after %s event(s): %s", folded, e)
+        raise
+
+    add_summary_fields(folded=folded, batches=batches)
+    return {'folded': folded}
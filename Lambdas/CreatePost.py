@@ -1,36 +1,129 @@
 import os
 import json
-import logging
 import base64
 import pymysql
-import boto3
-from botocore.exceptions import ClientError
+from fashpo import client_error, log_invocation, logger
 from datetime import datetime, timedelta
-
-# Set up logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+from db_connection import get_connection
+import image_refs
+from image_variants import build_variants
+from post_uploads import UploadNotReady, delete_upload, read_upload
+from s3_images import get_s3_client
+from session_tokens import check_session
 
 # Environment variables
-db_host = os.environ['DB_HOST']
-db_name = os.environ['DB_NAME']
-db_user = os.environ['DB_USER']
-db_pass = os.environ['DB_PASS']
 bucket_name = os.environ['BUCKET_NAME']  # Make sure to set this in your Lambda environment variables
 
-# AWS clients
-s3_client = boto3.client('s3')
-rds_client = pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name, connect_timeout=5)
-
 def upload_image_to_s3(image_data, bucket, folder_name, file_name):
     try:
-        s3_client.put_object(Bucket=bucket, Key=f"{folder_name}/{file_name}", Body=image_data)
+        get_s3_client().put_object(Bucket=bucket, Key=f"{folder_name}/{file_name}", Body=image_data,
+                                   ContentType='image/jpeg')
         return True
-    except ClientError as e:
+    except client_error() as e:
         logger.error("Could not upload to S3: %s", e)
         return False
 
+def delete_uploaded_images(keys):
+    # Best effort: remove objects uploaded for a post that was never created
+    objects = [{'Key': key} for key in keys]
+    if not objects:
+        return
+    try:
+        get_s3_client().delete_objects(Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+    except client_error() as e:
+        logger.error("Could not remove orphaned uploads %s: %s", [o['Key'] for o in objects], e)
+
+def claim_uploaded_image(rds_client, upload_id, owner_id):
+    # Second half of the two-phase upload: check the slot reserved by
+    # RequestPostUpload belongs to this owner and download the object if it
+    # matches it. Returns (image key, bytes, None) or (None, None, error response).
+    with rds_client.cursor() as cur:
+        cur.execute("""
+            SELECT owner_id, image_key, content_type, max_bytes, post_id FROM PostUploads
+            WHERE id = %s AND expires_at > UTC_TIMESTAMP()
+        """, (upload_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None, None, {'statusCode': 404, 'body': json.dumps("Upload not found or expired")}
+    slot_owner_id, image_key, content_type, max_bytes, existing_post_id = row
+    if str(slot_owner_id) != str(owner_id):
+        return None, None, {'statusCode': 403, 'body': json.dumps("Upload belongs to another user")}
+    if existing_post_id is not None:
+        return None, None, {'statusCode': 409, 'body': json.dumps({"message": "Upload already used",
+                                                             "post_id": existing_post_id})}
+    try:
+        image_data = read_upload(image_key, content_type, max_bytes)
+    except UploadNotReady as e:
+        return None, None, {'statusCode': 400, 'body': json.dumps(str(e))}
+    return image_key, image_data, None
+
+def upload_variants(image_data, image_hash):
+    # Store thumb/medium/full renditions under the image's content folder so
+    # grid views can skip the full image. Returns {variant: key}. Runs before
+    # the transaction: the keys are derived from the bytes, so uploading the
+    # same photo twice just rewrites identical objects. Raises ImageUploadFailed
+    # with the keys that did make it.
+    folder_name = image_refs.content_folder(image_hash)
+    variant_keys = {}
+    for variant, variant_data in build_variants(image_data).items():
+        file_name = "uploaded_image.jpg" if variant == 'full' else f"{variant}.jpg"
+        if not upload_image_to_s3(variant_data, bucket_name, folder_name, file_name):
+            raise ImageUploadFailed(variant_keys)
+        variant_keys[variant] = f"{folder_name}/{file_name}"
+    return variant_keys
+
+def variants_in_s3(image_hash, variant_keys):
+    # One LIST of the content folder: are all the renditions still there?
+    try:
+        response = get_s3_client().list_objects_v2(Bucket=bucket_name,
+                                                   Prefix=f"{image_refs.content_folder(image_hash)}/")
+    except client_error() as e:
+        logger.error("Could not list stored image %s: %s", image_hash, e)
+        return False
+    stored = {obj['Key'] for obj in response.get('Contents', [])}
+    return set(variant_keys.values()) <= stored
+
+def discard_uploaded_variants(rds_client, image_hash, variant_keys):
+    # Best effort after a failed post: the objects are shared by every post
+    # of the photo, so only delete them while the hash is locked and has no
+    # references, the same way CleanupPostImages does.
+    try:
+        with rds_client.cursor() as cur:
+            if not image_refs.is_referenced(cur, image_hash):
+                delete_uploaded_images(variant_keys.values())
+        rds_client.commit()
+    except pymysql.MySQLError as e:
+        logger.error("Could not check image %s before removing it: %s", image_hash, e)
+        rds_client.rollback()
+
+class UploadAlreadyClaimed(Exception):
+    pass
+
+class ImageUploadFailed(Exception):
+    pass
+
+class ImageNotStored(Exception):
+    # The first reference to an image found no uploaded objects to record
+    pass
+
+# A repost can find the photo's objects deleted between the pre-check and the
+# transaction; it then uploads them and tries again
+IMAGE_ATTEMPTS = 2
+
+@log_invocation
 def lambda_handler(event, context):
+    # Borrow the container's warm connection instead of holding one opened at import time
+    try:
+        with get_connection() as rds_client:
+            return create_post(event, rds_client)
+    except pymysql.MySQLError as e:
+        logger.error("Database connection failed: %s", e)
+        return {
+            'statusCode': 500,
+            'body': json.dumps("Database connection failed")
+        }
+
+def create_post(event, rds_client):
     # Parse the JSON body from the event
     try:
         body = json.loads(event.get('body', '{}'))
@@ -48,120 +141,169 @@ def lambda_handler(event, context):
     clothing_items_str = ', '.join(clothing_items)
     gender_restriction = body.get('gender_restriction', 'Hello')
 
+    # Callers that logged in with a session token may only post as themselves;
+    # checked before an upload is claimed or anything is written to S3
+    session_error = check_session(event, owner_id)
+    if session_error:
+        return session_error
+
     # Get the current time in UTC
     utc_now = datetime.utcnow()
     est_offset = timedelta(hours=-5)  # Assuming EST is 5 hours behind UTC
     est_now = utc_now + est_offset
     created_at_str = est_now.strftime('%Y-%m-%d %H:%M:%S')
 
-    # Insert a new row into the Posts table
-    try:
-        with rds_client.cursor() as cur:
-            cur.execute("""
-                INSERT INTO Posts (owner_id, category, description, clothing_items, created_at, gender_restriction) 
-                VALUES (%s, %s, %s, %s, %s, %s);
-            """, (owner_id, category, description, clothing_items_str, created_at_str, gender_restriction))
-            post_id = cur.lastrowid
-            rds_client.commit()
-    except pymysql.MySQLError as e:
-        logger.error(f"Failed to insert new post: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps("Error inserting new post into database")
-        }
-
-    # Process the image data and upload to S3
-    if 'image' in body:
+    image_url = None
+    variant_keys = None
+    image_data = None
+    image_hash = None
+    upload_key = None
+    uploaded_variants = None
+    upload_id = body.get('upload_id')
+    if upload_id:
+        # Two-phase upload: the photo is already in S3 (see RequestPostUpload).
+        # It goes through the same processing as a base64 upload, so it is
+        # stripped of EXIF and gets renditions before anyone can fetch it.
+        upload_key, image_data, error = claim_uploaded_image(rds_client, upload_id, owner_id)
+        if error:
+            return error
+    elif 'image' in body:
+        # Older app versions send the photo as base64 inside the JSON body
         image_data = base64.b64decode(body['image'])
-        folder_name = f"post_{post_id}"
-        file_name = "uploaded_image.jpg"
-        if upload_image_to_s3(image_data, bucket_name, folder_name, file_name):
-            image_url = f"https://{bucket_name}.s3.amazonaws.com/{folder_name}/{file_name}"
-            # Update the Posts table with the image URL
-            try:
-                with rds_client.cursor() as cur:
+    if image_data is not None:
+        # Stored under its content hash, so reposting the same photo reuses
+        # the objects already in S3
+        image_hash = image_refs.content_hash(image_data)
+
+    for attempt in range(1, IMAGE_ATTEMPTS + 1):
+        # S3 is never called while the transaction below holds locks
+        if image_hash and uploaded_variants is None:
+            with rds_client.cursor() as cur:
+                already_stored = image_refs.stored_variants(cur, image_hash) is not None
+            if already_stored and attempt == 1:
+                logger.info("Image %s is already stored, skipping the upload", image_hash)
+            else:
+                try:
+                    uploaded_variants = upload_variants(image_data, image_hash)
+                except ImageUploadFailed as e:
+                    rds_client.rollback()
+                    if e.args[0]:
+                        discard_uploaded_variants(rds_client, image_hash, e.args[0])
+                    return {
+                        'statusCode': 500,
+                        'body': json.dumps("Failed to upload image to S3")
+                    }
+
+        # Everything below is one transaction: either the post appears with its
+        # owner, category and clothing items, or nothing does.
+        round_trips = 0
+        try:
+            with rds_client.cursor() as cur:
+                # Claim the upload slot first: the lock keeps the expired-upload
+                # sweep off it, and a concurrent or repeated finalize of the same
+                # upload waits here and then finds it taken
+                if upload_id:
                     cur.execute("""
-                        UPDATE Posts SET image_url = %s WHERE id = %s;
-                    """, (image_url, post_id))
-                    rds_client.commit()
-            except pymysql.MySQLError as e:
-                logger.error(f"Failed to update database with image URL: {e}")
-                return {
-                    'statusCode': 500,
-                    'body': json.dumps("Error updating the database with image URL")
-                }
-        else:
+                        SELECT id FROM PostUploads
+                        WHERE id = %s AND post_id IS NULL AND expires_at > UTC_TIMESTAMP()
+                        FOR UPDATE
+                    """, (upload_id,))
+                    round_trips += 1
+                    if cur.fetchone() is None:
+                        raise UploadAlreadyClaimed(upload_id)
+
+                if image_hash:
+                    # Holds the hash's ImageRefs row until commit, so cleanup
+                    # cannot delete the objects under this post
+                    variant_keys = image_refs.acquire(cur, image_hash)
+                    round_trips += 2
+                    if variant_keys is None:
+                        # First reference: record the objects uploaded above,
+                        # unless cleanup of the photo's previous last post
+                        # removed them before the row was locked
+                        if uploaded_variants is None or not variants_in_s3(image_hash, uploaded_variants):
+                            raise ImageNotStored(image_hash)
+                        variant_keys = uploaded_variants
+                        image_refs.set_variants(cur, image_hash, variant_keys)
+                        round_trips += 1
+                    image_url = f"https://{bucket_name}.s3.amazonaws.com/{variant_keys['full']}"
+
+                cur.execute("""
+                    INSERT INTO Posts (owner_id, category, description, clothing_items, created_at, gender_restriction,
+                                       image_url, image_variants, image_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
+                """, (owner_id, category, description, clothing_items_str, created_at_str, gender_restriction,
+                      image_url, json.dumps(variant_keys) if variant_keys else None, image_hash))
+                post_id = cur.lastrowid
+                round_trips += 1
+
+                # Record the post against its owner
+                cur.execute("""
+                    INSERT IGNORE INTO UserPosts (user_id, post_id) VALUES (%s, %s);
+                """, (owner_id, post_id))
+                round_trips += 1
+
+                # Posts reference their category by name; resolve it to the id in the same statement
+                cur.execute("""
+                    INSERT IGNORE INTO CategoryPosts (category_id, post_id)
+                    SELECT id, %s FROM Categories WHERE category_name = %s;
+                """, (post_id, category))
+                round_trips += 1
+
+                # pymysql turns this into a single multi-row INSERT
+                if clothing_items:
+                    cur.executemany("""
+                        INSERT INTO ClothingArticles (post_id, type) VALUES (%s, %s)
+                    """, [(post_id, item) for item in clothing_items])
+                    round_trips += 1
+
+                # Marks the upload slot claimed above as used
+                if upload_id:
+                    cur.execute("UPDATE PostUploads SET post_id = %s WHERE id = %s", (post_id, upload_id))
+                    round_trips += 1
+
+            rds_client.commit()
+            round_trips += 1
+            break
+        except ImageNotStored:
+            rds_client.rollback()
+            logger.warning("Image %s is not in S3 (attempt %d of %d), uploading it again",
+                           image_hash, attempt, IMAGE_ATTEMPTS)
+            uploaded_variants = None
+        except UploadAlreadyClaimed:
+            logger.warning("Upload %s was already turned into a post or has expired", upload_id)
+            rds_client.rollback()
+            if uploaded_variants:
+                discard_uploaded_variants(rds_client, image_hash, uploaded_variants)
+            return {
+                'statusCode': 409,
+                'body': json.dumps("Upload already used or expired")
+            }
+        except pymysql.MySQLError as e:
+            logger.error("Failed to create post, rolling back: %s", e)
+            rds_client.rollback()
+            # A direct upload stays in S3 so the client can retry; unclaimed
+            # slots are swept with their object once they expire.
+            if uploaded_variants:
+                discard_uploaded_variants(rds_client, image_hash, uploaded_variants)
             return {
                 'statusCode': 500,
-                'body': json.dumps("Failed to upload image to S3")
+                'body': json.dumps("Error inserting new post into database")
             }
-    
-    # Update the Users table with the new post ID
-    try:
-        with rds_client.cursor() as cur:
-            # First, retrieve the current user_posts for the owner_id
-            cur.execute("""
-                SELECT user_posts FROM Users WHERE id = %s;
-            """, (owner_id,))
-            result = cur.fetchone()
-            
-            # Append the new post ID to the existing list of post IDs
-            user_posts = result[0] + ',' + str(post_id) if result and result[0] else str(post_id)
-            
-            # Update the Users table with the new user_posts
-            cur.execute("""
-                UPDATE Users SET user_posts = %s WHERE id = %s;
-            """, (user_posts, owner_id))
-            rds_client.commit()
-    except pymysql.MySQLError as e:
-        logger.error(f"Failed to update user posts: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps("Error updating user posts in database")
-        }
-        
-    try:
-        with rds_client.cursor() as cur:
-            # First, retrieve the current post_ids for the category
-            cur.execute("""
-                SELECT post_ids FROM Categories WHERE category_name = %s;
-            """, (category,))
-            result = cur.fetchone()
-            
-            # Append the new post ID to the existing list of post IDs
-            if result and result[0]:
-                post_ids = result[0] + ',' + str(post_id)
-            else:
-                post_ids = str(post_id)
-            
-            # Update the Categories table with the new post_ids
-            cur.execute("""
-                UPDATE Categories SET post_ids = %s WHERE category_name = %s;
-            """, (post_ids, category))
-            rds_client.commit()
-    except pymysql.MySQLError as e:
-        logger.error(f"Failed to update Categories: {e}")
+    else:
+        if uploaded_variants:
+            discard_uploaded_variants(rds_client, image_hash, uploaded_variants)
         return {
             'statusCode': 500,
-            'body': json.dumps("Error updating Categories in database")
+            'body': json.dumps("Failed to upload image to S3")
         }
 
-    clothing_article_ids = []  # Initialize a list to store the generated IDs
-    try:
-        with rds_client.cursor() as cur:
-            for item in clothing_items:
-                cur.execute("""
-                    INSERT INTO ClothingArticles (post_id, type) VALUES (%s, %s);
-                """, (post_id, item))
-                clothing_article_ids.append(cur.lastrowid)  # Append the last generated ID
-            rds_client.commit()
-    except pymysql.MySQLError as e:
-        logger.error(f"Failed to insert clothing items: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps("Error inserting clothing items into ClothingArticles table")
-        }
+    logger.info("Created post %s with %d clothing items in %d database round trips",
+                post_id, len(clothing_items), round_trips)
 
+    # The post serves the processed renditions, never the raw upload
+    if upload_key:
+        delete_upload(upload_key)
 
     # Return a successful response message
     return {
@@ -169,6 +311,6 @@ def lambda_handler(event, context):
         'body': json.dumps({
             "message": "Post created successfully",
             "post_id": post_id,
-            "image_url": image_url if 'image' in body else None
+            "image_url": image_url
         })
     }
@@ -1,14 +1,14 @@
 import pymysql
 import os
-import logging
 import json
 import hashlib
 import base64
 from datetime import datetime, timedelta
+from db_connection import get_connection
+from fashpo import log_invocation, logger
 
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# MySQL error code for a duplicate key
+DUPLICATE_ENTRY = 1062
 
 def hash_password(password, salt=None):
     if salt is None:
@@ -18,16 +18,8 @@ def hash_password(password, salt=None):
     hashed = base64.b64encode(salt + hashed).decode('ascii')
     return hashed
 
+@log_invocation
 def lambda_handler(event, context):
-    # RDS connection details from environment variables
-    rds_host = os.getenv('DB_HOST')
-    name = os.getenv('DB_USER')
-    password = os.getenv('DB_PASS')
-    db_name = os.getenv('DB_NAME')
-
-    # Log environment information
-    logger.info("Connecting to database at: {}".format(rds_host))
-
     # Get the current time in UTC
     utc_now = datetime.utcnow()
     # Assuming EST is 5 hours behind UTC (4 hours during daylight saving time)
@@ -36,14 +28,11 @@ def lambda_handler(event, context):
     est_now = utc_now + est_offset
     created_at_str = est_now.strftime('%Y-%m-%d %H:%M:%S')
 
-    # Log the event received
-    logger.info(f"Received event: {event}")
-
     # Parse the incoming JSON data from the 'body' of the event
     try:
         body = json.loads(event['body'])
     except json.JSONDecodeError as e:
-        logger.error("Error parsing JSON body from event: {}".format(e))
+        logger.error("Error parsing JSON body from event: %s", e)
         return {'statusCode': 400, 'body': json.dumps({'message': 'Invalid JSON format received'})}
 
     username = body.get('username')
@@ -61,9 +50,23 @@ def lambda_handler(event, context):
     hashed_password = hash_password(password_to_hash)
 
     try:
-        # Use a with statement to ensure the connection is closed properly
-        with pymysql.connect(host=rds_host, user=name, passwd=password, db=db_name, connect_timeout=5) as conn:
+        # Borrow the container's warm connection for this invocation
+        with get_connection() as conn:
             with conn.cursor() as cur:
+                # The availability checks can lag a few seconds behind other
+                # signups, so the insert itself skips a taken username or email.
+                # The lookup runs on idx_users_username/idx_users_email (migration
+                # 011) and locks the range it read, so a concurrent signup for
+                # the same name waits on it instead of slipping past.
+                cur.execute(
+                    "SELECT username = %s FROM Users WHERE username = %s OR email = %s LIMIT 1 FOR UPDATE",
+                    (username, username, email))
+                existing = cur.fetchone()
+                if existing is not None:
+                    conn.rollback()
+                    taken = 'Username' if existing[0] else 'Email'
+                    logger.warning("Signup rejected, %s already in use", taken.lower())
+                    return {'statusCode': 409, 'body': json.dumps({'message': f'{taken} already in use'})}
                 # SQL INSERT statement
                 sql = """
                 INSERT INTO Users (username, user_categories, user_posts, favorite_posts, email, gender, age, height, password, created_at)
@@ -75,8 +78,16 @@ def lambda_handler(event, context):
                 user_id = cur.lastrowid  # Get the last inserted id
                 message = f"User {username} successfully created with ID {user_id}."
                 logger.info(message)
+    except pymysql.err.IntegrityError as e:
+        # A unique key added later on username or email rejects the insert
+        if e.args and e.args[0] == DUPLICATE_ENTRY:
+            taken = 'Email' if 'email' in str(e).lower() else 'Username'
+            logger.warning("Signup rejected, %s already in use", taken.lower())
+            return {'statusCode': 409, 'body': json.dumps({'message': f'{taken} already in use'})}
+        logger.exception("Database connection or execution failed: %s", e)
+        return {'statusCode': 500, 'body': json.dumps({'message': 'Database connection or execution failed'})}
     except pymysql.MySQLError as e:
-        logger.exception("Database connection or execution failed: {}".format(e))
+        logger.exception("Database connection or execution failed: %s", e)
         return {'statusCode': 500, 'body': json.dumps({'message': 'Database connection or execution failed'})}
 
     return {'statusCode': 200, 'body': json.dumps({'message': message, 'created_at': created_at_str, 'id': user_id})}
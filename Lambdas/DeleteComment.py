@@ -1,24 +1,15 @@
 import json
 import pymysql
-import os
 import sys
-import logging
-
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# Environment variables
-DB_HOST = os.environ['DB_HOST']
-DB_NAME = os.environ['DB_NAME']
-DB_USER = os.environ['DB_USER']
-DB_PASS = os.environ['DB_PASS']
+from db_connection import get_connection
+from fashpo import log_invocation, logger
 
+@log_invocation
 def lambda_handler(event, context):
 
     try:
         # Establish a connection to the database using 'with' statement
-        with pymysql.connect(host=DB_HOST, user=DB_USER, passwd=DB_PASS, db=DB_NAME, connect_timeout=5) as conn:
+        with get_connection() as conn:
             logger.info("SUCCESS: Connection to RDS MySQL instance succeeded")
 
             body = json.loads(event['body'])
@@ -27,23 +18,18 @@ def lambda_handler(event, context):
             commentId = str(body['commentId'])
 
             with conn.cursor() as cursor:
-                # Get the current comments list for the post
-                cursor.execute("SELECT comments FROM Posts WHERE id = %s", (postId,))
-                result = cursor.fetchone()
-                if result and result[0]:
-                    current_comments = result[0].split(',')
-                    if commentId in current_comments:
-                        # Remove the commentId from the list
-                        current_comments.remove(commentId)
-                        new_comments = ','.join(current_comments)
-
-                        # Update the comments column
-                        cursor.execute("UPDATE Posts SET comments = %s WHERE id = %s", (new_comments, postId))
-                        conn.commit()
-                        return {
-                            'statusCode': 200,
-                            'body': json.dumps('Comment successfully deleted.')
-                        }
+                # Soft-delete the comment; matching on post_id keeps the old
+                # "comment must belong to this post" check
+                deleted = cursor.execute("""
+                    UPDATE Comments SET deleted_at = NOW()
+                    WHERE id = %s AND post_id = %s AND deleted_at IS NULL
+                """, (commentId, postId))
+                if deleted:
+                    conn.commit()
+                    return {
+                        'statusCode': 200,
+                        'body': json.dumps('Comment successfully deleted.')
+                    }
                 return {
                     'statusCode': 404,
                     'body': json.dumps('Comment or Post not found.')
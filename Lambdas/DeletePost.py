@@ -1,18 +1,28 @@
+import os
 import pymysql
 import json
-import os
-import logging
 from datetime import datetime, timedelta
+from db_connection import get_connection
+from fashpo import client_error, get_client, log_invocation, logger
+import image_refs
+from posts import post_image_keys
 
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# Name of the CleanupPostImages function; image cleanup is skipped when unset
+cleanup_function_name = os.environ.get('CLEANUP_FUNCTION_NAME')
 
-# Helper function to remove the ID from a comma-separated list
-def remove_id_from_list(id_list, id_to_remove):
-    id_list = id_list.split(',') if id_list else []
-    id_list = [id for id in id_list if id.strip() and id.strip() != str(id_to_remove)]
-    return ','.join(id_list)
+# Hand the post's S3 objects to CleanupPostImages without waiting for it
+def schedule_image_cleanup(post_id, image_keys, image_hash=None):
+    if not cleanup_function_name or not image_keys:
+        return
+    try:
+        get_client('lambda').invoke(
+            FunctionName=cleanup_function_name,
+            InvocationType='Event',
+            Payload=json.dumps({'post_id': post_id, 'image_keys': image_keys, 'content_hash': image_hash})
+        )
+    except client_error() as e:
+        # The post is already deleted; orphaned objects are harmless and can be swept later
+        logger.error("Could not schedule image cleanup for post %s: %s", post_id, e)
 
 # Helper function to get the current time in EST
 def get_current_time_est():
@@ -22,6 +32,7 @@ def get_current_time_est():
     return est_time
 
 # Lambda handler function
+@log_invocation
 def lambda_handler(event, context):
     # Parse the incoming ID from the event
     body = json.loads(event['body'])
@@ -29,42 +40,42 @@ def lambda_handler(event, context):
     if not post_id:
         return {'statusCode': 400, 'body': json.dumps('No ID provided.')}
 
-    # Get database credentials from environment variables
-    db_host = os.environ['DB_HOST']
-    db_name = os.environ['DB_NAME']
-    db_user = os.environ['DB_USER']
-    db_pass = os.environ['DB_PASS']
-
     try:
         # Connect to the database
-        with pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name, connect_timeout=5) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cur:
-                # Check and remove the ID from the Users table
-                cur.execute("SELECT id, user_posts, favorite_posts FROM Users")
-                users = cur.fetchall()
-                for user_id, user_posts, favorite_posts in users:
-                    new_user_posts = remove_id_from_list(user_posts, post_id)
-                    new_favorite_posts = remove_id_from_list(favorite_posts, post_id)
-                    if user_posts != new_user_posts or favorite_posts != new_favorite_posts:
-                        cur.execute("UPDATE Users SET user_posts = %s, favorite_posts = %s WHERE id = %s",
-                                    (new_user_posts, new_favorite_posts, user_id))
+                # Lock just this post's row; the image keys are needed for cleanup
+                cur.execute("""
+                    SELECT image_url, image_variants, image_hash FROM Posts
+                    WHERE id = %s AND deleted_at IS NULL
+                    FOR UPDATE
+                """, (post_id,))
+                post = cur.fetchone()
+                if not post:
+                    return {'statusCode': 404, 'body': json.dumps(f'Post {post_id} not found.')}
 
-                # Check and remove the ID from the Categories table
-                cur.execute("SELECT id, post_ids FROM Categories")
-                categories = cur.fetchall()
-                for category_id, post_ids in categories:
-                    new_post_ids = remove_id_from_list(post_ids, post_id)
-                    if post_ids != new_post_ids:
-                        cur.execute("UPDATE Categories SET post_ids = %s WHERE id = %s",
-                                    (new_post_ids, category_id))
+                # The join tables are indexed on post_id, so only the rows that
+                # reference this post are read and locked, however many users exist
+                cur.execute("DELETE FROM UserPosts WHERE post_id = %s", (post_id,))
+                cur.execute("DELETE FROM Favorites WHERE item_type = 'post' AND item_id = %s", (post_id,))
+                cur.execute("DELETE FROM CategoryPosts WHERE post_id = %s", (post_id,))
 
                 # Update the Posts table with the current timestamp in EST
                 est_timestamp = get_current_time_est()
                 cur.execute("UPDATE Posts SET deleted_at = %s WHERE id = %s", (est_timestamp, post_id))
 
+                # Shared images are only removed with their last post
+                image_hash = post[2]
+                remove_images = image_refs.release(cur, image_hash) if image_hash else True
+
                 # Commit the changes
                 conn.commit()
 
+        # S3 objects are removed in the background once the database change is committed
+        if remove_images:
+            image_keys = post_image_keys({'image_url': post[0], 'image_variants': post[1]})
+            schedule_image_cleanup(post_id, image_keys, image_hash)
+
     except pymysql.MySQLError as e:
         logger.error(e)
         return {'statusCode': 500, 'body': json.dumps('Database connection failed.')}
@@ -1,49 +1,77 @@
 import pymysql
 import json
-import os
+from db_connection import get_connection
+from category_catalog import category_names
+from posts import post_image_key
+from s3_images import get_image_url
+from fashpo import log_invocation, logger
 
+@log_invocation
 def lambda_handler(event, context):
     # Parse the user_id from the event
     user_id = event['queryStringParameters']['user_id']
 
-    # Environment variables
-    db_host = os.environ['DB_HOST']
-    db_name = os.environ['DB_NAME']
-    db_user = os.environ['DB_USER']
-    db_pass = os.environ['DB_PASS']
-
     # Query logic wrapped inside a 'with' statement
     try:
-        with pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name, connect_timeout=5) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cur:
-                # Select user categories based on user_id
-                cur.execute("SELECT user_categories FROM Users WHERE id = %s", user_id)
-                user_categories_result = cur.fetchone()
-                if user_categories_result:
-                    category_ids = user_categories_result[0].split(',')
-                    
-                    # Query Categories table to get category names
-                    categories = []
-                    for category_id in category_ids:
-                        cur.execute("SELECT id, category_name FROM Categories WHERE id = %s", category_id)
-                        category_result = cur.fetchone()
-                        if category_result:
-                            categories.append({"id": str(category_result[0]), "name": category_result[1]})
-                    conn.commit()
-                else:
+                # Everything the screen shows in one round trip. Starting from Users
+                # keeps the 404 for unknown ids: no row means no user, and a user
+                # without subscriptions comes back as one row with NULLs. Both
+                # subqueries are range reads on the CategoryPosts primary key, and
+                # the latest post is joined in for its thumbnail.
+                cur.execute("""
+                    SELECT s.category_id, s.unseen_count, p.id, p.image_url, p.image_variants
+                    FROM Users u
+                    LEFT JOIN (
+                        SELECT s.id, s.user_id, s.category_id,
+                               (SELECT COUNT(*) FROM CategoryPosts cp
+                                WHERE cp.category_id = s.category_id
+                                  AND cp.post_id > s.last_seen_post_id) as unseen_count,
+                               (SELECT MAX(cp.post_id) FROM CategoryPosts cp
+                                WHERE cp.category_id = s.category_id) as latest_post_id
+                        FROM CategorySubscriptions s
+                        WHERE s.user_id = %s
+                    ) s ON s.user_id = u.id
+                    LEFT JOIN Posts p ON p.id = s.latest_post_id
+                    WHERE u.id = %s
+                    ORDER BY s.id
+                """, (user_id, user_id))
+                rows = cur.fetchall()
+                if not rows:
                     return {
                         "statusCode": 404,
                         "body": json.dumps(f"User with ID {user_id} not found")
                     }
 
+                subscriptions = [row for row in rows if row[0] is not None]
+                # Names come from the catalog cache; categories that no longer exist are left out
+                names = category_names(cur, [row[0] for row in subscriptions])
+
     except pymysql.MySQLError as e:
-        print("ERROR: Unexpected error: Could not connect to MySQL instance.")
-        print(e)
+        logger.error("ERROR: Unexpected error: Could not connect to MySQL instance: %s", e)
         return {
             "statusCode": 500,
             "body": json.dumps("Server error")
         }
-    
+
+    categories = []
+    for category_id, unseen_count, latest_post_id, image_url, image_variants in subscriptions:
+        if category_id not in names:
+            continue
+        thumbnail_key = None
+        if latest_post_id is not None:
+            thumbnail_key = post_image_key({'image_url': image_url, 'image_variants': image_variants}, 'thumb')
+        categories.append({
+            "id": str(category_id),
+            "name": names[category_id],
+            "unseen_count": int(unseen_count),
+            "latest_post_id": str(latest_post_id) if latest_post_id is not None else None,
+            "latest_thumbnail_key": thumbnail_key,
+            # Signed locally (or a CDN link), so no extra request per category
+            "latest_thumbnail_url": get_image_url(thumbnail_key) if thumbnail_key else None
+        })
+
     # Return the result
     return {
         "statusCode": 200,
@@ -0,0 +1,63 @@
+import os
+import pymysql
+from db_connection import get_connection
+from category_catalog import category_names
+from posts import (FIRST_PAGE, decode_cursor, encode_cursor, fetch_recent_posts, get_image_variant,
+                   merge_recent, post_image_key)
+from s3_images import get_image_mode, resolve_images
+from fashpo import JSON_HEADERS, add_summary_fields, error_response, log_invocation, logger, parse_body, response
+
+# Posts per page unless the client asks for fewer
+feed_page_size = int(os.environ.get('FEED_PAGE_SIZE', '20'))
+max_feed_page_size = int(os.environ.get('MAX_FEED_PAGE_SIZE', '50'))
+
+# Home feed: the newest posts across every category the user subscribes to,
+# newest first, paged with the same opaque cursor as category_view.
+#
+# Each page is two round trips whatever the number of subscriptions: the
+# subscription ids, then one UNION ALL reading the newest page_size + 1 posts
+# of every (category, gender restriction) from its recency index. Those
+# newest-first lists are k-way merged in memory; the extra row per branch
+# tells us whether another page exists. Category names come from the catalog
+# cache.
+@log_invocation
+def lambda_handler(event, context):
+    try:
+        body = parse_body(event)
+        user_id = body['userId']
+        gender = body['gender']
+        page_size = max(1, min(int(body.get('pageSize') or feed_page_size), max_feed_page_size))
+        before_post_id = decode_cursor(body.get('cursor')) or FIRST_PAGE
+        image_mode = get_image_mode(body)
+        image_variant = get_image_variant(body)
+    except (KeyError, ValueError) as e:
+        logger.error("Bad feed request: %s", e)
+        return error_response(400, str(e), JSON_HEADERS)
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT category_id FROM CategorySubscriptions WHERE user_id = %s", (user_id,))
+                categories = list(category_names(cur, [row[0] for row in cur.fetchall()]).values())
+
+                streams = fetch_recent_posts(cur, categories, gender, before_post_id, page_size + 1) if categories else []
+    except pymysql.MySQLError as e:
+        logger.error("ERROR: Unexpected error: Could not connect to MySQL instance: %s", e)
+        return error_response(500, "Internal server error", JSON_HEADERS)
+
+    posts = merge_recent(streams, page_size + 1)
+    next_cursor = encode_cursor(posts[page_size - 1]['id']) if len(posts) > page_size else None
+    posts = posts[:page_size]
+
+    # Posts whose image is unavailable are skipped; the cursor still moves past them
+    image_keys = [post_image_key(post, image_variant) for post in posts]
+    images_data = [{
+        'post_id': str(post['id']),
+        'owner_id': post['owner_id'],
+        'description': post['description'],
+        'category': post['category'],
+        **image_fields
+    } for post, image_fields in zip(posts, resolve_images(image_keys, image_mode)) if image_fields]
+
+    add_summary_fields(categories=len(categories), streams=len(streams), posts=len(images_data))
+    return response(200, {'images_data': images_data, 'next_cursor': next_cursor}, JSON_HEADERS)
@@ -1,83 +1,59 @@
-import os
 import json
-import logging
-import base64
-import pymysql
-import boto3
-from botocore.exceptions import ClientError
-
-# Set up logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# Environment variables
-db_host = os.environ['DB_HOST']
-db_name = os.environ['DB_NAME']
-db_user = os.environ['DB_USER']
-db_pass = os.environ['DB_PASS']
-bucket_name = os.environ['BUCKET_NAME']
-
-def get_s3_image(image_key):
-    s3 = boto3.client('s3')
-    try:
-        logger.info(f"Fetching image from S3 with key: {image_key}")
-        response = s3.get_object(Bucket=bucket_name, Key=image_key)
-        return base64.b64encode(response['Body'].read()).decode('utf-8')
-    except ClientError as e:
-        logger.error(f"Failed to fetch image from S3 with key: {image_key}")
-        logger.error(e)
-        return None
+from db_connection import get_connection
+from posts import get_image_variant, hydrate_posts, post_image_key
+from s3_images import get_image_mode, resolve_images
+from fashpo import log_invocation, logger
 
+@log_invocation
 def lambda_handler(event, context):
-    logger.info(f"Received event: {event}")
-
     try:
         body = json.loads(event['body'])
         user_id = body['user_id']
         post_type = body['post_type']
-        logger.info(f"User ID: {user_id}, Post Type: {post_type}")
+        image_mode = get_image_mode(body)
+        image_variant = get_image_variant(body)
+        logger.info("User ID: %s, Post Type: %s", user_id, post_type)
 
-        with pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name, connect_timeout=5) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cur:
-                column_name = 'user_posts' if post_type == 'user_posts' else 'favorite_posts'
-                cur.execute(f"SELECT {column_name} FROM Users WHERE id = %s", (user_id,))
-                posts_result = cur.fetchone()
+                # Own posts in creation order, favorites in the order they were added
+                if post_type == 'user_posts':
+                    cur.execute("SELECT post_id FROM UserPosts WHERE user_id = %s ORDER BY post_id", (user_id,))
+                else:
+                    cur.execute("""
+                        SELECT item_id FROM Favorites
+                        WHERE user_id = %s AND item_type = 'post'
+                        ORDER BY id
+                    """, (user_id,))
+                post_ids = [row[0] for row in cur.fetchall()]
 
-                if not posts_result or not posts_result[0]:
-                    logger.info(f"No posts found for user ID: {user_id}")
+                if not post_ids:
+                    logger.info("No posts found for user ID: %s", user_id)
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json'},
                         'body': json.dumps([])  # Return an empty list
                     }
 
-                post_ids = posts_result[0].split(',')
-                logger.info(f"Post IDs fetched: {post_ids}")
+                logger.info("Fetched %s post IDs", len(post_ids))
+
+                # Fetch every post on the list in one query, keeping the stored order
+                posts = hydrate_posts(cur, post_ids)
 
             images_data = []
-            for post_id in post_ids:
-                with conn.cursor() as cur:
-                    # Modified query to also fetch 'owner_id', 'description', and 'category'
-                    cur.execute("""
-                        SELECT image_url, owner_id, description, category 
-                        FROM Posts 
-                        WHERE id = %s
-                    """, (post_id,))
-                    result = cur.fetchone()
-                    if result:
-                        image_url, owner_id, description, category = result
-                        image_key = '/'.join(image_url.split('/')[3:])
-                        image_base64 = get_s3_image(image_key)
-                        if image_base64:
-                            images_data.append({
-                                'post_id': post_id,
-                                'image_base64': image_base64,
-                                'owner_id': owner_id,
-                                'description': description,
-                                'category': category
-                            })
+            # Resolve the page's images: presigned URLs, or base64 fetched concurrently
+            image_keys = [post_image_key(post, image_variant) for post in posts]
+            for post, image_fields in zip(posts, resolve_images(image_keys, image_mode)):
+                if image_fields:
+                    images_data.append({
+                        'post_id': str(post['id']),
+                        'owner_id': post['owner_id'],
+                        'description': post['description'],
+                        'category': post['category'],
+                        **image_fields
+                    })
 
-            logger.info(f"Image data fetched: {images_data}")
+            logger.info("Returning %s image(s) as %s.", len(images_data), image_mode)
 
             return {
                 'statusCode': 200,
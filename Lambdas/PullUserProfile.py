@@ -1,47 +1,39 @@
 import pymysql
 import json
-import os
-import logging
+from db_connection import get_connection
+from category_catalog import category_names
+from fashpo import log_invocation, logger
 
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+def get_categories_dict(user_id, cursor):
+    # Fetch the user's subscribed category ids; the names come from the catalog cache
+    cursor.execute("SELECT category_id FROM CategorySubscriptions WHERE user_id = %s", (user_id,))
+    names = category_names(cursor, [row['category_id'] for row in cursor.fetchall()])
+    # Construct the categories dictionary
+    return {str(category_id): category_name for category_id, category_name in names.items()}
 
-def get_categories_dict(user_categories, cursor):
-    categories_dict = {}
-    if user_categories:
-        # Fetch category names for the corresponding IDs
-        categories_ids = user_categories.split(',')
-        sql_categories = "SELECT id, category_name FROM Categories WHERE id IN (%s)"
-        formatted_ids = ','.join(['%s'] * len(categories_ids))
-        cursor.execute(sql_categories % formatted_ids, tuple(categories_ids))
-        categories = cursor.fetchall()
-        # Construct the categories dictionary
-        categories_dict = {str(category['id']): category['category_name'] for category in categories}
-    return categories_dict
+def get_favorite_posts_dict(user_id, cursor):
+    # Create a dictionary of favorited post ids with the word 'Post'
+    cursor.execute("SELECT item_id FROM Favorites WHERE user_id = %s AND item_type = 'post' ORDER BY id", (user_id,))
+    return {row['item_id']: 'Post' for row in cursor.fetchall()}
 
-def get_favorite_posts_dict(favorite_posts):
-    # Split the favorite posts by comma and create a dictionary with the word 'Post'
-    return {int(post_id): 'Post' for post_id in favorite_posts.split(',') if post_id} if favorite_posts else {}
-
-def get_clothing_articles_dict(favorite_clothing, cursor):
+def get_clothing_articles_dict(user_id, cursor):
     clothing_articles_dict = {}
-    if favorite_clothing:
-        clothing_ids = favorite_clothing.split(',')
-        # Ensure the IDs are unique to avoid redundant queries
-        unique_clothing_ids = list(set(clothing_ids))
-        sql_clothing = "SELECT post_id, type FROM ClothingArticles WHERE id IN (%s)"
-        formatted_ids = ','.join(['%s'] * len(unique_clothing_ids))
-        cursor.execute(sql_clothing % formatted_ids, tuple(unique_clothing_ids))
-        clothing_articles = cursor.fetchall()
-        for article in clothing_articles:
-            post_id = article['post_id']
-            article_type = article['type']
-            # Append the type to the existing entry, separating with a comma if necessary
-            if post_id in clothing_articles_dict:
-                clothing_articles_dict[post_id] += ',' + article_type
-            else:
-                clothing_articles_dict[post_id] = article_type
+    sql_clothing = """
+        SELECT a.post_id, a.type
+        FROM Favorites f
+        JOIN ClothingArticles a ON a.id = f.item_id
+        WHERE f.user_id = %s AND f.item_type = 'clothing'
+    """
+    cursor.execute(sql_clothing, (user_id,))
+    clothing_articles = cursor.fetchall()
+    for article in clothing_articles:
+        post_id = article['post_id']
+        article_type = article['type']
+        # Append the type to the existing entry, separating with a comma if necessary
+        if post_id in clothing_articles_dict:
+            clothing_articles_dict[post_id] += ',' + article_type
+        else:
+            clothing_articles_dict[post_id] = article_type
     return clothing_articles_dict
 
 def update_favorite_posts_with_clothing(favorite_posts_dict, clothing_articles_dict):
@@ -56,10 +48,8 @@ def update_favorite_posts_with_clothing(favorite_posts_dict, clothing_articles_d
             favorite_posts_dict[post_id] = types
     return favorite_posts_dict
 
+@log_invocation
 def lambda_handler(event, context):
-    # Log the received event
-    logger.info("Received event: %s", event)
-    
     # Parse the incoming JSON payload
     body = json.loads(event['body'])
     username = body['username']
@@ -68,26 +58,19 @@ def lambda_handler(event, context):
     logger.info("Username received: %s", username)
 
     try:
-        # Using 'with' statement for proper connection management
-        with pymysql.connect(
-            host=os.environ['DB_HOST'],
-            user=os.environ['DB_USER'],
-            password=os.environ['DB_PASS'],
-            db=os.environ['DB_NAME'],
-            connect_timeout=5,
-            cursorclass=pymysql.cursors.DictCursor
-        ) as connection:
-            with connection.cursor() as cursor:
+        # Borrow the container's warm connection; it is returned when the block exits
+        with get_connection() as connection:
+            with connection.cursor(pymysql.cursors.DictCursor) as cursor:
                 # Check if the username exists and fetch details
-                sql_user = "SELECT id, gender, age, height, user_categories, favorite_posts, favorite_clothing FROM Users WHERE username = %s"
+                sql_user = "SELECT id, gender, age, height FROM Users WHERE username = %s"
                 cursor.execute(sql_user, (username,))
                 user = cursor.fetchone()
 
                 if user:
                     # User exists, process favorite posts and clothing
-                    categories_dict = get_categories_dict(user['user_categories'], cursor)
-                    favorite_posts_dict = get_favorite_posts_dict(user['favorite_posts'])
-                    clothing_articles_dict = get_clothing_articles_dict(user['favorite_clothing'], cursor)
+                    categories_dict = get_categories_dict(user['id'], cursor)
+                    favorite_posts_dict = get_favorite_posts_dict(user['id'], cursor)
+                    clothing_articles_dict = get_clothing_articles_dict(user['id'], cursor)
                     updated_favorites = update_favorite_posts_with_clothing(favorite_posts_dict, clothing_articles_dict)
 
                     response_body = {
@@ -111,9 +94,6 @@ def lambda_handler(event, context):
             },
         }
 
-        # Log the response
-        logger.info("Response: %s", response)
-
         return response
     except pymysql.MySQLError as e:
         # Log the error
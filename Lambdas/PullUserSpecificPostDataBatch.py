@@ -0,0 +1,42 @@
+import os
+import pymysql
+from db_connection import get_connection
+from post_state import get_post_states
+from fashpo import JSON_HEADERS, add_summary_fields, error_response, log_invocation, logger, parse_body, response
+
+# Most posts one request may ask about; a feed page is 20
+max_batch_posts = int(os.environ.get('MAX_POST_STATE_BATCH', '50'))
+
+# Batch form of PullUserSpecificPostData for rendering a whole feed page:
+# {"user_id": ..., "post_ids": [...], "comments_limit": n} returns
+# {"posts": [{"post_id", "articles", "post_favorited", "comments",
+# "comments_next_cursor"}, ...]} in the order of post_ids, from three queries
+# whatever the number of posts. comments_limit applies per post and may be 0
+# to leave comments out; later pages come from PullUserSpecificPostData.
+@log_invocation
+def lambda_handler(event, context):
+    try:
+        body = parse_body(event)
+        user_id = body['user_id']
+        post_ids = body['post_ids']
+        comments_limit = body.get('comments_limit')
+        if not isinstance(post_ids, list):
+            raise ValueError("post_ids must be a list")
+        if len(post_ids) > max_batch_posts:
+            raise ValueError(f"At most {max_batch_posts} post_ids per request")
+    except (KeyError, ValueError) as e:
+        logger.error("Bad post state request: %s", e)
+        return error_response(400, str(e), JSON_HEADERS)
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                states = get_post_states(cur, user_id, post_ids, comments_limit)
+    except ValueError as e:
+        return error_response(400, str(e), JSON_HEADERS)
+    except pymysql.MySQLError as e:
+        logger.error("ERROR: Unexpected error: Could not connect to MySQL instance: %s", e)
+        return error_response(500, "Internal server error", JSON_HEADERS)
+
+    add_summary_fields(posts=len(states))
+    return response(200, {'posts': states}, JSON_HEADERS)
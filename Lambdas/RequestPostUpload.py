@@ -0,0 +1,48 @@
+import pymysql
+from db_connection import get_connection
+from post_uploads import CONTENT_TYPES, max_upload_bytes, new_upload, presigned_upload, upload_slot_ttl
+from session_tokens import check_session
+from fashpo import JSON_HEADERS, error_response, log_invocation, logger, parse_body, response
+
+# First half of creating a post: reserve an upload slot and hand back a
+# presigned POST for it. The app uploads the photo directly to S3 with the
+# returned url and fields, then calls CreatePost with the upload_id.
+@log_invocation
+def lambda_handler(event, context):
+    try:
+        body = parse_body(event)
+        owner_id = body['owner_id']
+    except (KeyError, ValueError) as e:
+        logger.error("Bad upload request: %s", e)
+        return error_response(400, "owner_id is required", JSON_HEADERS)
+
+    content_type = body.get('content_type', 'image/jpeg')
+    if content_type not in CONTENT_TYPES:
+        return error_response(400, f"Unsupported content type: {content_type}", JSON_HEADERS)
+
+    # Callers that logged in with a session token may only upload as themselves
+    session_error = check_session(event, owner_id)
+    if session_error:
+        return session_error
+
+    upload_id, image_key = new_upload(content_type)
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO PostUploads (id, owner_id, image_key, content_type, max_bytes, expires_at)
+                    VALUES (%s, %s, %s, %s, %s, UTC_TIMESTAMP() + INTERVAL %s SECOND)
+                """, (upload_id, owner_id, image_key, content_type, max_upload_bytes, upload_slot_ttl))
+            conn.commit()
+    except pymysql.MySQLError as e:
+        logger.error("Could not reserve an upload slot: %s", e)
+        return error_response(500, "Could not reserve an upload slot", JSON_HEADERS)
+
+    upload = presigned_upload(image_key, content_type, max_upload_bytes)
+    logger.info("Reserved upload %s for user %s", upload_id, owner_id)
+    return response(200, {
+        'upload_id': upload_id,
+        'url': upload['url'],
+        'fields': upload['fields'],
+        'max_bytes': max_upload_bytes,
+    }, JSON_HEADERS)
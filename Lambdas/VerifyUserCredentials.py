@@ -1,14 +1,12 @@
 import pymysql
-import os
-import logging
 import json
+import hmac
 import hashlib
 import base64
 from datetime import datetime, timedelta
-
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+from db_connection import get_connection
+from session_tokens import issue_token
+from fashpo import log_invocation, logger
 
 def validate_password(stored_password, provided_password):
     # Decode the stored_password which contains the salt and the hashed password
@@ -19,23 +17,15 @@ def validate_password(stored_password, provided_password):
     # Hash the provided_password using the same salt
     hashed = hashlib.pbkdf2_hmac('sha256', provided_password.encode('utf-8'), salt, 100000)
     # Compare the stored hashed password with the newly hashed provided password
-    return stored_hashed_password == hashed
+    return hmac.compare_digest(stored_hashed_password, hashed)
 
+@log_invocation
 def lambda_handler(event, context):
-    # RDS connection details from environment variables
-    rds_host = os.getenv('DB_HOST')
-    name = os.getenv('DB_USER')
-    password = os.getenv('DB_PASS')
-    db_name = os.getenv('DB_NAME')
-
-    # Log the event received
-    logger.info(f"Received event for authentication: {event}")
-
     # Parse the incoming JSON data from the 'body' of the event
     try:
         body = json.loads(event['body'])
     except json.JSONDecodeError as e:
-        logger.error("Error parsing JSON body from event: {}".format(e))
+        logger.error("Error parsing JSON body from event: %s", e)
         return {'statusCode': 400, 'body': json.dumps({'message': 'Invalid JSON format received'})}
 
     username = body.get('username')
@@ -47,20 +37,28 @@ def lambda_handler(event, context):
         return {'statusCode': 400, 'body': json.dumps({'message': 'Missing username or password'})}
 
     try:
-        # Use a with statement to ensure the connection is closed properly
-        with pymysql.connect(host=rds_host, user=name, passwd=password, db=db_name, connect_timeout=5) as conn:
+        # Borrow the container's warm connection for this invocation
+        with get_connection() as conn:
             with conn.cursor() as cur:
-                # SQL SELECT statement to retrieve the stored password
-                sql = "SELECT password FROM Users WHERE username = %s"
+                # SQL SELECT statement to retrieve the user id and stored password
+                sql = "SELECT id, password FROM Users WHERE username = %s"
                 cur.execute(sql, (username,))
                 result = cur.fetchone()
                 if result:
-                    stored_password = result[0]
+                    user_id, stored_password = result
                     # Validate the provided password against the stored password
                     if validate_password(stored_password, provided_password):
                         message = "Authentication successful for user {}.".format(username)
                         logger.info(message)
-                        return {'statusCode': 200, 'body': json.dumps({'message': message})}
+                        # The app sends this back as "Authorization: Bearer <token>" so later
+                        # requests are checked with one HMAC instead of another PBKDF2 run
+                        token, expires_at = issue_token(user_id)
+                        return {'statusCode': 200, 'body': json.dumps({
+                            'message': message,
+                            'user_id': user_id,
+                            'token': token,
+                            'expires_at': expires_at
+                        })}
                     else:
                         message = "Authentication failed for user {}.".format(username)
                         logger.warning(message)
@@ -70,5 +68,5 @@ def lambda_handler(event, context):
                     logger.warning(message)
                     return {'statusCode': 404, 'body': json.dumps({'message': message})}
     except pymysql.MySQLError as e:
-        logger.exception("Database connection or execution failed: {}".format(e))
+        logger.exception("Database connection or execution failed: %s", e)
         return {'statusCode': 500, 'body': json.dumps({'message': 'Database connection or execution failed'})}
@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from fashpo import logger
+
+# Seconds a loaded catalog is served without touching the database. After that
+# a one-row version check decides whether it is still good or must be reloaded.
+cache_ttl = float(os.environ.get('CATEGORY_CACHE_TTL', '300'))
+# The catalog is only kept if it has at most this many categories; a bigger
+# one is still served, just re-read on every request.
+max_entries = int(os.environ.get('CATEGORY_CACHE_MAX_ENTRIES', '5000'))
+
+# Row in CacheVersions bumped by every write to Categories (see migration 005)
+VERSION_NAME = 'categories'
+
+# Per-container cache: {category id: (name, public)}
+_catalog = None
+_version = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+_stats = {
+    'hits': 0,           # served from memory inside the TTL
+    'revalidations': 0,  # TTL expired but the version stamp had not moved
+    'misses': 0,         # loaded (or reloaded) the catalog from the database
+    'oversize': 0,       # catalog was larger than max_entries and not kept
+}
+
+
+def _row_value(row, key, index):
+    # The handlers use both tuple and DictCursor cursors
+    return row[key] if isinstance(row, dict) else row[index]
+
+
+def _read_version(cur):
+    cur.execute("SELECT version FROM CacheVersions WHERE name = %s", (VERSION_NAME,))
+    row = cur.fetchone()
+    return _row_value(row, 'version', 0) if row else 0
+
+
+def _load(cur):
+    # Read the stamp first: a write that lands between the two queries leaves
+    # us with an older stamp, so the next revalidation reloads.
+    version = _read_version(cur)
+    cur.execute("SELECT id, category_name, public FROM Categories")
+    catalog = {
+        int(_row_value(row, 'id', 0)): (_row_value(row, 'category_name', 1), bool(_row_value(row, 'public', 2)))
+        for row in cur.fetchall()
+    }
+    return catalog, version
+
+
+def get_catalog(cur):
+    # Returns {category id: (name, public)}, from memory whenever possible
+    global _catalog, _version, _loaded_at
+    now = time.monotonic()
+    with _lock:
+        if _catalog is not None and now - _loaded_at < cache_ttl:
+            _stats['hits'] += 1
+            return _catalog
+        catalog, version = _catalog, _version
+
+    if catalog is not None and _read_version(cur) == version:
+        with _lock:
+            _stats['revalidations'] += 1
+            _loaded_at = now
+        return catalog
+
+    catalog, version = _load(cur)
+    with _lock:
+        _stats['misses'] += 1
+        if len(catalog) > max_entries:
+            _stats['oversize'] += 1
+            logger.warning("Category catalog has %d entries, over the cache bound of %d",
+                           len(catalog), max_entries)
+            _catalog, _version = None, None
+        else:
+            _catalog, _version, _loaded_at = catalog, version, now
+    logger.info("Category catalog loaded at version %s (%d categories)", version, len(catalog))
+    return catalog
+
+
+def public_categories(cur):
+    # [(id, name)] for the category picker, in id order
+    return [(category_id, name) for category_id, (name, public) in sorted(get_catalog(cur).items()) if public]
+
+
+def category_names(cur, category_ids):
+    # {id: name} for the given ids, in the order given; unknown ids are left out
+    catalog = get_catalog(cur)
+    return {int(category_id): catalog[int(category_id)][0]
+            for category_id in category_ids if int(category_id) in catalog}
+
+
+def category_name(cur, category_id):
+    return category_names(cur, [category_id]).get(int(category_id))
+
+
+def bump_catalog_version(cur):
+    # For code that writes Categories. The triggers from migration 005 already
+    # do this for plain SQL writes; calling it as well is harmless. Runs in the
+    # caller's transaction so the stamp moves only if the write commits.
+    cur.execute("UPDATE CacheVersions SET version = version + 1 WHERE name = %s", (VERSION_NAME,))
+    invalidate()
+
+
+def invalidate():
+    # Forget this container's copy so the next read reloads
+    global _catalog, _version
+    with _lock:
+        _catalog, _version = None, None
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['cached_entries'] = len(_catalog) if _catalog is not None else 0
+        stats['version'] = _version
+    lookups = stats['hits'] + stats['revalidations'] + stats['misses']
+    stats['hit_rate'] = round((stats['hits'] + stats['revalidations']) / lookups, 3) if lookups else None
+    return stats
@@ -1,90 +1,103 @@
-import os
 import json
-import logging
-import base64
 import pymysql
-import boto3
-from botocore.exceptions import ClientError
+from db_connection import get_connection
+from category_catalog import category_name
+from posts import (FIRST_PAGE, decode_cursor, encode_cursor, fetch_recent_posts, get_image_variant,
+                   merge_recent, post_image_key)
+from s3_images import get_image_mode, resolve_images
+from fashpo import log_invocation, logger
 
-# Set up logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+def fetch_category_page(cur, category, gender, before_post_id, limit):
+    # Newest posts below the cursor that this gender may see
+    return merge_recent(fetch_recent_posts(cur, [category], gender, before_post_id, limit), limit)
 
-# Retrieve database and AWS credentials from environment variables
-db_host = os.environ['DB_HOST']
-db_name = os.environ['DB_NAME']
-db_user = os.environ['DB_USER']
-db_pass = os.environ['DB_PASS']
-bucket_name = os.environ['BUCKET_NAME']
-
-def get_s3_image(image_key):
-    s3 = boto3.client('s3')
-    try:
-        response = s3.get_object(Bucket=bucket_name, Key=image_key)
-        return base64.b64encode(response['Body'].read()).decode('utf-8')
-    except ClientError as e:
-        logger.error(f"Error fetching image from S3: {e}")
-        return None
-        
+@log_invocation
 def lambda_handler(event, context):
     try:
         body = json.loads(event['body'])
         category_id = body['categoryId']
         user_id = body['userId']
         gender = body['gender']
-        last_post_id = body['lastPostId']
         page_size = int(body['pageSize'])
+        image_mode = get_image_mode(body)
+        image_variant = get_image_variant(body)
+
+        # New clients send the opaque cursor from the previous page; older ones
+        # send the id of the last post they received, which means the same thing.
+        if body.get('cursor'):
+            before_post_id = decode_cursor(body['cursor'])
+        elif body.get('lastPostId'):
+            before_post_id = int(body['lastPostId'])
+        else:
+            before_post_id = FIRST_PAGE
+        first_page = before_post_id == FIRST_PAGE
 
         is_subscribed = False
         images_data = []
+        next_cursor = None
 
-        with pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name, connect_timeout=5) as conn:
+        with get_connection() as conn:
             logger.info("Successfully connected to the database")
 
             with conn.cursor() as cur:
-                cur.execute("SELECT user_categories FROM Users WHERE id = %s", (user_id,))
-                user_categories_result = cur.fetchone()
-                if user_categories_result and category_id in user_categories_result[0].split(','):
-                    is_subscribed = True
+                cur.execute("""
+                    SELECT EXISTS(SELECT 1 FROM CategorySubscriptions WHERE user_id = %s AND category_id = %s)
+                """, (user_id, category_id))
+                is_subscribed = bool(cur.fetchone()[0])
+
+                # Posts reference their category by name
+                name = category_name(cur, category_id)
 
-                cur.execute("SELECT post_ids FROM Categories WHERE id = %s", (category_id,))
-                category_result = cur.fetchone()
-                if category_result:
-                    post_ids = category_result[0].split(',')
-                    last_post_index = post_ids.index(last_post_id) + 1 if last_post_id else 0
+                # Another page is only needed when posts had to be skipped for a missing image
+                while name and len(images_data) < page_size:
+                    posts = fetch_category_page(cur, name, gender, before_post_id,
+                                                page_size - len(images_data))
+                    if not posts:
+                        next_cursor = None
+                        break
+                    before_post_id = posts[-1]['id']
+                    # More posts may follow only if this page came back full
+                    next_cursor = encode_cursor(before_post_id) if len(posts) == page_size - len(images_data) else None
 
-                    valid_post_count = 0
-                    for post_id in post_ids[last_post_index:]:
-                        if valid_post_count == page_size:
-                            break
-                        cur.execute("""
-                            SELECT id, image_url, gender_restriction, owner_id, description, category 
-                            FROM Posts 
-                            WHERE id = %s""", (post_id,))
-                        post_result = cur.fetchone()
-                        if post_result and (post_result[2] == gender or post_result[2] == 'All'):
-                            image_url = post_result[1]
-                            image_key = '/'.join(image_url.split('/')[3:])
-                            image_base64 = get_s3_image(image_key)
-                            if image_base64:
-                                images_data.append({
-                                    'post_id': str(post_result[0]),
-                                    'image_base64': image_base64,
-                                    'owner_id': post_result[3],
-                                    'description': post_result[4],
-                                    'category': post_result[5]
-                                })
-                                valid_post_count += 1
+                    image_keys = [post_image_key(post, image_variant) for post in posts]
+                    for post, image_fields in zip(posts, resolve_images(image_keys, image_mode)):
+                        if image_fields:
+                            images_data.append({
+                                'post_id': str(post['id']),
+                                'owner_id': post['owner_id'],
+                                'description': post['description'],
+                                'category': post['category'],
+                                **image_fields
+                            })
+                    if next_cursor is None:
+                        break
+
+                # Opening the top of a subscribed category clears its unseen count in MyCategories
+                if is_subscribed and first_page:
+                    cur.execute("""
+                        UPDATE CategorySubscriptions
+                        SET last_seen_post_id = GREATEST(last_seen_post_id,
+                            (SELECT COALESCE(MAX(post_id), 0) FROM CategoryPosts WHERE category_id = %s))
+                        WHERE user_id = %s AND category_id = %s
+                    """, (category_id, user_id, category_id))
+                    conn.commit()
 
         response = {
             'statusCode': 200,
             'body': json.dumps({
                 'images_data': images_data,
-                'is_subscribed': is_subscribed
+                'is_subscribed': is_subscribed,
+                'next_cursor': next_cursor
             })
         }
         return response
 
+    except ValueError as e:
+        logger.error("Bad pagination input: %s", e)
+        return {
+            'statusCode': 400,
+            'body': json.dumps({"error": str(e)})
+        }
     except pymysql.MySQLError as e:
         logger.error("ERROR: Unexpected error: Could not connect to MySQL instance.")
         logger.exception(e)
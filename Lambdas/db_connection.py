@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import pymysql
+from fashpo import logger
+
+# Environment variables
+db_host = os.environ['DB_HOST']
+db_name = os.environ['DB_NAME']
+db_user = os.environ['DB_USER']
+db_pass = os.environ['DB_PASS']
+connect_timeout = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))
+# A Lambda container serves one invocation at a time, so one connection is
+# normally enough; the cap only matters for handlers that fan out to threads.
+max_connections = int(os.environ.get('DB_MAX_CONNECTIONS', '2'))
+
+# Connections kept alive between warm invocations of this container
+_idle_connections = []
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max_connections)
+
+_stats = {
+    'hits': 0,            # reused a warm connection that answered the ping
+    'misses': 0,          # had to open a brand-new connection
+    'reconnects': 0,      # warm connection was dead and got replaced
+    'handshakes': 0,
+    'handshake_ms': 0.0,  # total time spent in TCP + TLS + auth handshakes
+}
+
+
+def _open_connection():
+    started = time.perf_counter()
+    conn = pymysql.connect(host=db_host, user=db_user, passwd=db_pass, db=db_name,
+                           connect_timeout=connect_timeout)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        _stats['handshakes'] += 1
+        _stats['handshake_ms'] += elapsed_ms
+    logger.info("Opened new MySQL connection in %.1f ms", elapsed_ms)
+    return conn
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _acquire():
+    with _lock:
+        conn = _idle_connections.pop() if _idle_connections else None
+
+    if conn is None:
+        with _lock:
+            _stats['misses'] += 1
+        return _open_connection()
+
+    # Validate the warm connection; a frozen container may have outlived the
+    # server side wait_timeout or an RDS failover.
+    try:
+        conn.ping(reconnect=False)
+        with _lock:
+            _stats['hits'] += 1
+        return conn
+    except pymysql.MySQLError:
+        logger.info("Warm MySQL connection failed ping, reconnecting")
+        _close_quietly(conn)
+        with _lock:
+            _stats['reconnects'] += 1
+        return _open_connection()
+
+
+def _release(conn, discard=False):
+    if not discard:
+        try:
+            # Drop whatever the handler left uncommitted and end the read
+            # snapshot so the next invocation does not see stale rows.
+            conn.rollback()
+        except pymysql.MySQLError:
+            discard = True
+
+    if discard:
+        _close_quietly(conn)
+        return
+
+    with _lock:
+        _idle_connections.append(conn)
+
+
+@contextmanager
+def get_connection():
+    # Drop-in replacement for `with pymysql.connect(...) as conn:` that keeps
+    # the connection open for the next warm invocation instead of closing it.
+    if not _slots.acquire(timeout=connect_timeout):
+        raise pymysql.err.OperationalError(
+            2002, f"Connection limit of {max_connections} reached for this container")
+    conn = None
+    try:
+        conn = _acquire()
+        yield conn
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        # The connection itself is suspect; never hand it out again.
+        if conn is not None:
+            _close_quietly(conn)
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            _release(conn)
+        _slots.release()
+        logger.debug("DB connection stats: %s", _stats)
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['idle_connections'] = len(_idle_connections)
+    stats['max_connections'] = max_connections
+    return stats
+
+
+def close_all():
+    with _lock:
+        connections = list(_idle_connections)
+        _idle_connections.clear()
+    for conn in connections:
+        _close_quietly(conn)
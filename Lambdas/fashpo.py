@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import functools
+import importlib
+import threading
+
+# Shared runtime for the handlers. Everything heavy (boto3, botocore, AWS
+# clients) is created on first use rather than at import, so a cold start
+# only pays for what the invoked handler actually touches.
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+_modules = {}
+_clients = {}
+_lock = threading.RLock()
+# Milliseconds spent importing modules and creating clients in this container
+_init_ms = {}
+
+
+def _timed(label, create):
+    started = time.perf_counter()
+    value = create()
+    _init_ms[label] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Initialised %s in %.1f ms", label, _init_ms[label])
+    return value
+
+
+def lazy_import(name):
+    # importlib.import_module, timed and done at most once per container
+    module = _modules.get(name)
+    if module is None:
+        with _lock:
+            module = _modules.get(name)
+            if module is None:
+                module = _modules[name] = _timed(f"import {name}", lambda: importlib.import_module(name))
+    return module
+
+
+def client_error():
+    # botocore's ClientError for `except` clauses. The expression is only
+    # evaluated once an exception reaches that clause, so it costs nothing on
+    # the success path.
+    return lazy_import('botocore.exceptions').ClientError
+
+
+def get_client(service, endpoint_url=None, **config):
+    # One boto3 client per service for the life of the container. `config` is
+    # passed to botocore.config.Config (pool size, timeouts, ...).
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                boto3 = lazy_import('boto3')
+                botocore_config = lazy_import('botocore.config').Config(**config) if config else None
+                client = _clients[service] = _timed(
+                    f"{service} client",
+                    lambda: boto3.client(service, endpoint_url=endpoint_url, config=botocore_config))
+    return client
+
+
+def get_init_timings():
+    with _lock:
+        return dict(_init_ms)
+
+
+def parse_body(event):
+    # API Gateway proxy events carry the request as a JSON string
+    return json.loads(event.get('body') or '{}')
+
+
+def response(status_code, body, headers=None):
+    # Lambda proxy response with a JSON body
+    result = {'statusCode': status_code, 'body': json.dumps(body)}
+    if headers:
+        result['headers'] = dict(headers)
+    return result
+
+
+def error_response(status_code, message, headers=None):
+    return response(status_code, {'error': message}, headers)
+
+
+# Logging policy. Every handler logs through the root logger, so one filter
+# on it applies everywhere:
+#   * %-style arguments are only rendered for records that are kept;
+#   * long strings and collections are cut to LOG_MAX_FIELD_CHARS, and whole
+#     messages to LOG_MAX_MESSAGE_CHARS;
+#   * values under image/password/token-like keys are never written out;
+#   * INFO and DEBUG can be sampled per invocation (LOG_SAMPLE_RATES, e.g.
+#     "INFO=0.1,DEBUG=0"); warnings and errors are always kept;
+#   * log_invocation adds one structured summary line per invocation.
+max_field_chars = int(os.environ.get('LOG_MAX_FIELD_CHARS', '256'))
+max_message_chars = int(os.environ.get('LOG_MAX_MESSAGE_CHARS', '2048'))
+sample_rates = {
+    level.strip().upper(): float(rate)
+    for level, rate in (item.split('=') for item in os.environ.get('LOG_SAMPLE_RATES', '').split(',') if '=' in item)
+}
+# Keys whose values are never logged; anything mentioning a password, secret
+# or token is treated the same way
+REDACTED_KEYS = {'image', 'image_base64', 'image_data', 'images_data', 'authorization', 'cookie'}
+REDACTED_WORDS = ('password', 'secret', 'token')
+
+_invocation = threading.local()
+_cold_start = True
+
+
+def _is_redacted(key):
+    key = str(key).lower()
+    return key in REDACTED_KEYS or any(word in key for word in REDACTED_WORDS)
+
+
+def _truncate(text, limit):
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+def _parse_body(body):
+    # API Gateway bodies are JSON strings; look inside so their fields are redacted too
+    if isinstance(body, str):
+        try:
+            return json.loads(body)
+        except ValueError:
+            pass
+    return body
+
+
+def redact(value, depth=0):
+    # Copy of value that is safe and small enough to log
+    if isinstance(value, dict):
+        if depth > 3:
+            return f"{{...{len(value)} keys}}"
+        return {key: f"[redacted {len(str(item))} chars]" if _is_redacted(key) else
+                     redact(_parse_body(item), depth + 1) if key == 'body' else redact(item, depth + 1)
+                for key, item in list(value.items())[:20]}
+    if isinstance(value, (list, tuple, set)):
+        items = [redact(item, depth + 1) for item in list(value)[:10]]
+        if len(value) > 10:
+            items.append(f"...(+{len(value) - 10} items)")
+        return items
+    if isinstance(value, (bytes, bytearray)):
+        return f"[{len(value)} bytes]"
+    if isinstance(value, str):
+        return _truncate(value, max_field_chars)
+    return value
+
+
+class _PolicyFilter(logging.Filter):
+    def filter(self, record):
+        if record.levelno < logging.WARNING and record.name != 'fashpo.summary':
+            sampled = getattr(_invocation, 'sampled', None)
+            if sampled is not None and not sampled.get(record.levelname, True):
+                return False
+        if isinstance(record.args, dict):
+            # logger.info("... %s", some_dict) stores the dict itself as args
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(redact(arg) for arg in record.args)
+        if isinstance(record.msg, str) and len(record.msg) > max_message_chars:
+            record.msg = _truncate(record.msg, max_message_chars)
+        return True
+
+
+if not any(isinstance(existing, _PolicyFilter) for existing in logger.filters):
+    logger.addFilter(_PolicyFilter())
+
+summary_logger = logging.getLogger('fashpo.summary')
+summary_logger.setLevel(logging.INFO)
+
+
+def add_summary_fields(**fields):
+    # Extra counters for this invocation's summary line (rows, images, ...)
+    summary = getattr(_invocation, 'summary', None)
+    if summary is not None:
+        summary.update(fields)
+
+
+def log_invocation(handler):
+    # Decorator for lambda_handler: per-invocation sampling decision, then a
+    # single JSON summary line with the outcome and timings.
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _cold_start
+        _invocation.sampled = {level: random.random() < rate for level, rate in sample_rates.items()}
+        _invocation.summary = {}
+        cold_start, _cold_start = _cold_start, False
+        started = time.perf_counter()
+        result = None
+        try:
+            result = handler(event, context)
+            return result
+        finally:
+            summary = {
+                'handler': handler.__module__,
+                'request_id': getattr(context, 'aws_request_id', None),
+                'status': result.get('statusCode') if isinstance(result, dict) else 'error' if result is None else None,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                'cold_start': cold_start,
+            }
+            if isinstance(result, dict) and isinstance(result.get('body'), str):
+                summary['response_bytes'] = len(result['body'])
+            if cold_start:
+                summary['init_ms'] = get_init_timings()
+            # Counters from shared modules, if this handler uses them
+            for module_name, field in (('db_connection', 'db'), ('category_catalog', 'category_cache'),
+                                       ('post_cache', 'post_cache'), ('image_disk_cache', 'image_cache'),
+                                       ('signup_filter', 'signup_filter')):
+                module = sys.modules.get(module_name)
+                if module is not None:
+                    summary[field] = module.get_stats()
+            summary.update(redact(_invocation.summary))
+            summary_logger.info("%s", json.dumps(summary, default=str))
+            _invocation.sampled = None
+            _invocation.summary = None
+    return wrapper
@@ -0,0 +1,170 @@
+import os
+import mmap
+import time
+import base64
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from fashpo import logger
+
+# Per-container cache of S3 image bytes in Lambda's /tmp, so the images a warm
+# container serves over and over are read from local disk instead of being
+# downloaded again. Files are named after the S3 key and ETag, so a replaced
+# object can never be served under the old entry.
+#
+# Image keys are written once (per upload slot or per content hash), so an
+# entry is trusted for revalidate_after seconds; after that a conditional GET
+# (If-None-Match) confirms it without transferring the body again.
+cache_dir = os.environ.get('IMAGE_DISK_CACHE_DIR', '/tmp/fashpo-images')
+# Total bytes kept on disk; /tmp is 512 MB by default and shared with the handler
+max_bytes = int(os.environ.get('IMAGE_DISK_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Objects larger than this are served but never stored
+max_object_bytes = int(os.environ.get('IMAGE_DISK_CACHE_MAX_OBJECT_BYTES', str(16 * 1024 * 1024)))
+revalidate_after = float(os.environ.get('IMAGE_DISK_CACHE_REVALIDATE_AFTER', '300'))
+
+# {s3 key: [etag, path, size, validated at]}, least recently used first
+_entries = OrderedDict()
+_total_bytes = 0
+_lock = threading.Lock()
+
+_stats = {
+    'hits': 0,           # served from disk, including after a revalidation
+    'misses': 0,         # downloaded from S3 and stored
+    'revalidations': 0,  # conditional GET answered 304 Not Modified
+    'evictions': 0,      # removed to stay under max_bytes
+    'bytes_saved': 0,    # S3 bytes not downloaded thanks to hits
+}
+
+
+def _reset_dir():
+    # Files left by an earlier runtime in this sandbox are not in the index;
+    # start from an empty directory rather than count them against the cap.
+    try:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        return True
+    except OSError as e:
+        logger.warning("Image disk cache disabled, cannot use %s: %s", cache_dir, e)
+        return False
+
+
+_enabled = max_bytes > 0 and _reset_dir()
+
+
+def _path_for(image_key, etag):
+    name = hashlib.sha256(f"{image_key}\0{etag}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, name)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _drop(image_key):
+    # Caller holds _lock
+    global _total_bytes
+    entry = _entries.pop(image_key, None)
+    if entry is not None:
+        _total_bytes -= entry[2]
+        _remove_file(entry[1])
+    return entry
+
+
+def lookup(image_key):
+    # Returns (etag, fresh) for a cached image, or None. A stale entry is still
+    # returned so the caller can revalidate it with If-None-Match.
+    if not _enabled:
+        return None
+    with _lock:
+        entry = _entries.get(image_key)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[3] < revalidate_after
+
+
+def revalidated(image_key):
+    # S3 answered 304: the stored bytes are current for another period
+    with _lock:
+        entry = _entries.get(image_key)
+        if entry is not None:
+            entry[3] = time.monotonic()
+            _stats['revalidations'] += 1
+
+
+def read_base64(image_key):
+    # The cached image base64-encoded straight from a memory map of the file,
+    # or None if it is no longer cached (evicted, or the file went missing).
+    with _lock:
+        entry = _entries.get(image_key)
+        if entry is None:
+            return None
+        _entries.move_to_end(image_key)
+        path, size = entry[1], entry[2]
+    try:
+        with open(path, 'rb') as f:
+            if size == 0:
+                return ''
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                encoded = base64.b64encode(mapped).decode('utf-8')
+    except (OSError, ValueError) as e:
+        logger.warning("Dropping unreadable cached image %s: %s", image_key, e)
+        with _lock:
+            if _entries.get(image_key) is entry:
+                _drop(image_key)
+        return None
+    with _lock:
+        _stats['hits'] += 1
+        _stats['bytes_saved'] += size
+    return encoded
+
+
+def store(image_key, etag, data):
+    # Write the downloaded bytes and make room by evicting the least recently
+    # used images. Failures only cost the caching, never the response.
+    global _total_bytes
+    with _lock:
+        _stats['misses'] += 1
+    if not _enabled or not etag or len(data) > min(max_object_bytes, max_bytes):
+        return
+    path = _path_for(image_key, etag)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        _remove_file(temp_path)
+        logger.warning("Could not cache image %s on disk: %s", image_key, e)
+        return
+    with _lock:
+        previous = _entries.get(image_key)
+        if previous is not None and previous[1] != path:
+            _drop(image_key)
+        elif previous is not None:
+            _total_bytes -= previous[2]
+        _entries[image_key] = [etag, path, len(data), time.monotonic()]
+        _entries.move_to_end(image_key)
+        _total_bytes += len(data)
+        while _total_bytes > max_bytes and len(_entries) > 1:
+            evicted_key = next(iter(_entries))
+            _drop(evicted_key)
+            _stats['evictions'] += 1
+
+
+def invalidate(image_key):
+    with _lock:
+        _drop(image_key)
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_entries)
+        stats['bytes'] = _total_bytes
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+    return stats
@@ -0,0 +1,70 @@
+import json
+import hashlib
+
+# Content-addressed image storage. An uploaded photo is stored once under
+# images/<sha256 of its bytes>/ and every post of that photo points at the
+# same objects; ImageRefs counts the live posts per hash (migration 008).
+#
+# The ImageRefs row doubles as the lock for its objects: CreatePost takes it
+# before reusing them or recording the ones it uploaded, DeletePost before
+# dropping the last reference, and CleanupPostImages before deleting them. So
+# a repost racing the deletion of the previous last post either keeps the
+# objects alive or finds them gone and uploads them again.
+
+CONTENT_PREFIX = 'images/'
+
+
+def content_hash(image_data):
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def content_folder(image_hash):
+    return f"{CONTENT_PREFIX}{image_hash}"
+
+
+def stored_variants(cur, image_hash):
+    # Plain read, no lock: the {variant: key} dict if the image is already
+    # stored, so a repost can skip uploading it. acquire() has the final say.
+    cur.execute("SELECT image_variants FROM ImageRefs WHERE content_hash = %s", (image_hash,))
+    row = cur.fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+def acquire(cur, image_hash):
+    # Add a reference to the image, locking its row until the transaction
+    # ends. Returns the stored {variant: key} dict, or None when this is the
+    # first reference and the caller must upload the objects (set_variants).
+    cur.execute("""
+        INSERT INTO ImageRefs (content_hash, ref_count) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+    """, (image_hash,))
+    cur.execute("SELECT image_variants FROM ImageRefs WHERE content_hash = %s", (image_hash,))
+    row = cur.fetchone()
+    variants = row[0] if row else None
+    return json.loads(variants) if variants else None
+
+
+def set_variants(cur, image_hash, variant_keys):
+    cur.execute("UPDATE ImageRefs SET image_variants = %s WHERE content_hash = %s",
+                (json.dumps(variant_keys), image_hash))
+
+
+def release(cur, image_hash):
+    # Drop a reference. Returns True when it was the last one: the row is gone
+    # and the caller should schedule the objects for deletion.
+    cur.execute("SELECT ref_count FROM ImageRefs WHERE content_hash = %s FOR UPDATE", (image_hash,))
+    row = cur.fetchone()
+    if row is None:
+        return False
+    if row[0] <= 1:
+        cur.execute("DELETE FROM ImageRefs WHERE content_hash = %s", (image_hash,))
+        return True
+    cur.execute("UPDATE ImageRefs SET ref_count = ref_count - 1 WHERE content_hash = %s", (image_hash,))
+    return False
+
+
+def is_referenced(cur, image_hash):
+    # Locks the hash (or the gap where its row would go) until the
+    # transaction ends, so no post can claim it while its objects are deleted
+    cur.execute("SELECT 1 FROM ImageRefs WHERE content_hash = %s FOR UPDATE", (image_hash,))
+    return cur.fetchone() is not None
@@ -0,0 +1,52 @@
+import io
+import os
+from fashpo import lazy_import, logger
+
+# Longest edge in pixels and JPEG quality for each rendition. 'full' is capped
+# too so a 48 MP photo from a new phone does not become the stored original.
+VARIANTS = {
+    'thumb': (int(os.environ.get('IMAGE_THUMB_SIZE', '320')), 75),
+    'medium': (int(os.environ.get('IMAGE_MEDIUM_SIZE', '1080')), 82),
+    'full': (int(os.environ.get('IMAGE_FULL_SIZE', '2048')), 88),
+}
+
+
+def _load_pillow():
+    # Pillow is only bundled with CreatePost and is imported on the first
+    # upload rather than during the cold start
+    try:
+        return lazy_import('PIL.Image'), lazy_import('PIL.ImageOps')
+    except ImportError:  # pragma: no cover - depends on the deployment package
+        return None, None
+
+
+def build_variants(image_data):
+    # Returns {variant name: JPEG bytes}. Re-encoding from pixels drops EXIF
+    # (GPS position, device details) after the orientation tag has been applied.
+    # If Pillow is missing or the upload cannot be decoded the original bytes
+    # are kept as the only 'full' rendition, which is what CreatePost used to store.
+    Image, ImageOps = _load_pillow()
+    if Image is None:
+        logger.warning("Pillow is not available, storing the original image only")
+        return {'full': image_data}
+
+    try:
+        with Image.open(io.BytesIO(image_data)) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            variants = {}
+            for name, (max_edge, quality) in VARIANTS.items():
+                rendition = image.copy()
+                rendition.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                output = io.BytesIO()
+                rendition.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+                variants[name] = output.getvalue()
+    except (OSError, ValueError) as e:
+        logger.warning("Could not decode uploaded image, storing it unchanged: %s", e)
+        return {'full': image_data}
+
+    logger.info("Built image variants: %s",
+                {name: len(data) for name, data in variants.items()})
+    return variants
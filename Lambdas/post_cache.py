@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from fashpo import logger
+
+# Per-container cache of Posts rows (the POST_COLUMNS dicts hydrate_posts
+# returns), so hot posts are served by warm containers without a query.
+#
+# Writers run in their own containers and cannot reach this one, so deletions
+# arrive through the 'posts' CacheVersions stamp (migration 012): at most every
+# version_check_interval seconds the reader compares it with the stamp it
+# last saw and empties the cache when it has moved. Image bytes are never
+# cached here.
+max_entries = int(os.environ.get('POST_CACHE_MAX_ENTRIES', '2000'))
+cache_ttl = float(os.environ.get('POST_CACHE_TTL', '60'))
+version_check_interval = float(os.environ.get('POST_CACHE_VERSION_CHECK', '5'))
+
+# Row in CacheVersions bumped whenever a post is deleted (see migration 012)
+VERSION_NAME = 'posts'
+
+# {post id as str: (expires at, post dict)}, least recently used first
+_entries = OrderedDict()
+_version = None
+_checked_at = None
+_lock = threading.Lock()
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,      # pushed out by the size bound
+    'expirations': 0,    # found but past the TTL
+    'version_checks': 0,
+    'flushes': 0,        # emptied because the stamp moved
+}
+
+
+def needs_version_check():
+    with _lock:
+        return _checked_at is None or time.monotonic() - _checked_at >= version_check_interval
+
+
+def check_version(cur):
+    # Compare the 'posts' stamp with the one this cache was filled under and
+    # start over if any post has been deleted since. Cheap enough to call on
+    # every request; it only queries once per version_check_interval.
+    global _version, _checked_at
+    if not needs_version_check():
+        return
+    cur.execute("SELECT version FROM CacheVersions WHERE name = %s", (VERSION_NAME,))
+    row = cur.fetchone()
+    version = (row['version'] if isinstance(row, dict) else row[0]) if row else 0
+    with _lock:
+        _stats['version_checks'] += 1
+        if version != _version:
+            if _entries:
+                _stats['flushes'] += 1
+                logger.info("Posts changed (version %s -> %s), emptying the post cache", _version, version)
+            _entries.clear()
+            _version = version
+        _checked_at = time.monotonic()
+
+
+def get_many(post_ids):
+    # Returns ({post id: post} for the ids cached and fresh, [ids still to load])
+    now = time.monotonic()
+    found, missing = {}, []
+    with _lock:
+        for post_id in post_ids:
+            key = str(post_id)
+            entry = _entries.get(key)
+            if entry is not None and entry[0] > now:
+                _entries.move_to_end(key)
+                found[key] = entry[1]
+                _stats['hits'] += 1
+                continue
+            if entry is not None:
+                del _entries[key]
+                _stats['expirations'] += 1
+            _stats['misses'] += 1
+            missing.append(key)
+    return found, missing
+
+
+def put_many(posts):
+    if max_entries <= 0:
+        return
+    expires_at = time.monotonic() + cache_ttl
+    with _lock:
+        for post in posts:
+            key = str(post['id'])
+            _entries[key] = (expires_at, post)
+            _entries.move_to_end(key)
+        while len(_entries) > max_entries:
+            _entries.popitem(last=False)
+            _stats['evictions'] += 1
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_entries)
+        stats['version'] = _version
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+    return stats
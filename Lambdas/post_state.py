@@ -0,0 +1,131 @@
+import os
+from posts import FIRST_PAGE, encode_cursor, normalize_post_ids
+from vote_log import TALLY_COLUMNS
+from fashpo import logger
+
+# The signed-in user's view of a set of posts: whether they favorited each
+# post, their vote and favorite on every clothing article with its tallies,
+# and the first page of comments. However many posts are asked for this is
+# at most three queries, one per kind of data, each a set of index lookups.
+
+# Comments returned per page unless the client asks for fewer
+comments_page_size = int(os.environ.get('COMMENTS_PAGE_SIZE', '20'))
+max_comments_page_size = int(os.environ.get('MAX_COMMENTS_PAGE_SIZE', '100'))
+# Branches per UNION ALL statement when reading several posts' comments
+max_comment_branches_per_query = int(os.environ.get('COMMENT_BRANCHES_PER_QUERY', '64'))
+
+
+def calculate_percentage(num_up_votes, num_down_votes):
+    total_votes = num_up_votes + num_down_votes
+
+    # Calculate percentage if there are any votes
+    percentage_up_votes = (num_up_votes / total_votes * 100) if total_votes > 0 else 0
+    return round(percentage_up_votes)
+
+
+def comments_limit_from(value):
+    # Clamp a client-supplied page size; 0 means no comments are wanted
+    if value is None or value == '':
+        return comments_page_size
+    return max(0, min(int(value), max_comments_page_size))
+
+
+def fetch_favorited_posts(cur, user_id, post_ids):
+    placeholders = ','.join(['%s'] * len(post_ids))
+    cur.execute(f"""
+        SELECT item_id FROM Favorites
+        WHERE user_id = %s AND item_type = 'post' AND item_id IN ({placeholders})
+    """, (user_id, *post_ids))
+    return {str(row[0]) for row in cur.fetchall()}
+
+
+def fetch_articles(cur, user_id, post_ids):
+    # {post id: [article]} with the user's votes and favorites joined on their
+    # primary keys and the exact vote tallies (see vote_log)
+    placeholders = ','.join(['%s'] * len(post_ids))
+    cur.execute(f"""
+        SELECT a.id, a.post_id, a.type,
+               up.user_id IS NOT NULL AS user_upvoted,
+               f.id IS NOT NULL AS user_favorited,
+               down.user_id IS NOT NULL AS user_downvoted,
+               {TALLY_COLUMNS}
+        FROM ClothingArticles a
+        LEFT JOIN ClothingVotes up
+               ON up.clothing_id = a.id AND up.user_id = %s AND up.vote_type = 'up'
+        LEFT JOIN Favorites f
+               ON f.user_id = %s AND f.item_type = 'clothing' AND f.item_id = a.id
+        LEFT JOIN ClothingVotes down
+               ON down.clothing_id = a.id AND down.user_id = %s AND down.vote_type = 'down'
+        WHERE a.post_id IN ({placeholders})
+        ORDER BY a.id
+    """, (user_id, user_id, user_id, *post_ids))
+    articles = {}
+    for article in cur.fetchall():
+        up_votes, down_votes = int(article[6]), int(article[7])
+        articles.setdefault(str(article[1]), []).append({
+            'id': article[0],
+            'type': article[2],
+            'user_upvoted': bool(article[3]),
+            'user_favorited': bool(article[4]),
+            'user_downvoted': bool(article[5]),
+            'upvote_percentage': calculate_percentage(up_votes, down_votes),
+            'total_votes': up_votes + down_votes
+        })
+    return articles
+
+
+def fetch_comments(cur, post_ids, limit, before_comment_id=None):
+    # {post id: (comments, next cursor)}, newest first. Each post is one range
+    # scan on idx_comments_post in a UNION ALL; the owner's name comes from the
+    # Users primary key. One extra row per post tells us whether there is
+    # another page without a COUNT.
+    branch_sql = """
+        (SELECT c.id, c.post_id, c.text, c.owner_id, u.username FROM Comments c
+         LEFT JOIN Users u ON u.id = c.owner_id
+         WHERE c.post_id = %s AND c.id < %s AND c.deleted_at IS NULL
+         ORDER BY c.id DESC
+         LIMIT %s)
+    """
+    rows_by_post = {post_id: [] for post_id in post_ids}
+    for start in range(0, len(post_ids), max_comment_branches_per_query):
+        chunk = post_ids[start:start + max_comment_branches_per_query]
+        params = []
+        for post_id in chunk:
+            params += [post_id, before_comment_id or FIRST_PAGE, limit + 1]
+        cur.execute(' UNION ALL '.join([branch_sql] * len(chunk)), tuple(params))
+        for row in cur.fetchall():
+            rows_by_post[str(row[1])].append(row)
+
+    comments = {}
+    for post_id, rows in rows_by_post.items():
+        # UNION ALL does not promise to keep each branch's order
+        rows.sort(key=lambda row: row[0], reverse=True)
+        comments[post_id] = ([{
+            'id': comment[0],
+            'text': comment[2],
+            'owner_id': comment[3],
+            'owner_username': comment[4]
+        } for comment in rows[:limit]], encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None)
+    return comments
+
+
+def get_post_states(cur, user_id, post_ids, comments_limit=None, comments_cursor=None):
+    # One state per distinct post id, in the order asked for. A comments
+    # cursor only makes sense for a single post.
+    post_ids = list(dict.fromkeys(normalize_post_ids(post_ids)))
+    if not post_ids:
+        return []
+    limit = comments_limit_from(comments_limit)
+
+    favorited = fetch_favorited_posts(cur, user_id, post_ids)
+    articles = fetch_articles(cur, user_id, post_ids)
+    comments = fetch_comments(cur, post_ids, limit, comments_cursor) if limit else {}
+    logger.info("Loaded state of %s post(s) for user %s", len(post_ids), user_id)
+
+    return [{
+        'post_id': post_id,
+        'articles': articles.get(post_id, []),
+        'post_favorited': post_id in favorited,
+        'comments': comments.get(post_id, ([], None))[0],
+        'comments_next_cursor': comments.get(post_id, ([], None))[1]
+    } for post_id in post_ids]
@@ -0,0 +1,115 @@
+import os
+import uuid
+from fashpo import client_error, logger
+from s3_images import bucket_name, get_s3_client
+
+# Two-phase post creation: RequestPostUpload reserves a slot and returns a
+# presigned POST so the app sends the photo straight to S3, then CreatePost
+# is called with the upload id. The image never passes through API Gateway;
+# CreatePost downloads it once to strip EXIF and build the renditions, stores
+# those under the content hash like any other post, and deletes the original.
+
+# Seconds the presigned POST can be used for
+upload_url_ttl = int(os.environ.get('POST_UPLOAD_URL_TTL', '900'))
+# Seconds a reserved slot can still be turned into a post; unclaimed slots are
+# swept (row and object) after this
+upload_slot_ttl = max(int(os.environ.get('POST_UPLOAD_SLOT_TTL', '3600')), upload_url_ttl)
+max_upload_bytes = int(os.environ.get('POST_UPLOAD_MAX_BYTES', str(15 * 1024 * 1024)))
+
+# Content types the app may upload, and the file name each is stored under
+CONTENT_TYPES = {
+    'image/jpeg': 'uploaded_image.jpg',
+    'image/png': 'uploaded_image.png',
+    'image/heic': 'uploaded_image.heic',
+    'image/webp': 'uploaded_image.webp',
+}
+
+
+class UploadNotReady(ValueError):
+    # The object is missing or does not match what the slot allows
+    pass
+
+
+def new_upload(content_type):
+    # (upload id, S3 key) for a fresh slot; same post_<hex> folder layout as
+    # images uploaded through CreatePost
+    upload_id = uuid.uuid4().hex
+    return upload_id, f"post_{upload_id}/{CONTENT_TYPES[content_type]}"
+
+
+def presigned_upload(image_key, content_type, max_bytes=None):
+    # A presigned POST rather than PUT: only POST policies can bound the size,
+    # so S3 itself refuses anything too large or of another type.
+    max_bytes = max_bytes or max_upload_bytes
+    return get_s3_client().generate_presigned_post(
+        Bucket=bucket_name,
+        Key=image_key,
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, max_bytes],
+        ],
+        ExpiresIn=upload_url_ttl,
+    )
+
+
+def read_upload(image_key, content_type, max_bytes):
+    # Download the uploaded object; raises UploadNotReady unless it is there
+    # and matches the slot. Returns its bytes.
+    try:
+        obj = get_s3_client().get_object(Bucket=bucket_name, Key=image_key)
+    except client_error() as e:
+        if e.response['Error'].get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            raise UploadNotReady("Image has not been uploaded") from e
+        raise
+    size = obj.get('ContentLength', 0)
+    if not 0 < size <= max_bytes:
+        obj['Body'].close()
+        raise UploadNotReady(f"Image size {size} is outside the allowed range")
+    if obj.get('ContentType') != content_type:
+        obj['Body'].close()
+        raise UploadNotReady(f"Image content type {obj.get('ContentType')} does not match {content_type}")
+    return obj['Body'].read()
+
+
+def delete_upload(image_key):
+    # Best effort: the raw upload is not needed once its post stores the
+    # processed renditions
+    try:
+        get_s3_client().delete_object(Bucket=bucket_name, Key=image_key)
+    except client_error() as e:
+        logger.error("Could not remove processed upload %s: %s", image_key, e)
+
+
+def sweep_expired_uploads(cur, limit=1000):
+    # Remove slots that were never turned into a post, and their objects.
+    # A slot whose object S3 failed to delete is kept for the next sweep.
+    # Returns the number of slots removed; the caller commits.
+    #
+    # The rows are locked before any object is deleted. A slot CreatePost is
+    # finalizing is locked by it and skipped; one it tries to claim after this
+    # makes it wait, then find the slot gone.
+    cur.execute("""
+        SELECT id, image_key FROM PostUploads
+        WHERE post_id IS NULL AND expires_at < UTC_TIMESTAMP()
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (limit,))
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+    response = get_s3_client().delete_objects(
+        Bucket=bucket_name,
+        Delete={'Objects': [{'Key': row[1]} for row in rows], 'Quiet': True}
+    )
+    errors = response.get('Errors', [])
+    if errors:
+        logger.error("Failed to delete %s expired upload(s), keeping their slots: %s", len(errors), errors)
+    failed_keys = {error.get('Key') for error in errors}
+    swept = [row[0] for row in rows if row[1] not in failed_keys]
+    if not swept:
+        return 0
+    placeholders = ','.join(['%s'] * len(swept))
+    cur.execute(f"DELETE FROM PostUploads WHERE id IN ({placeholders})", tuple(swept))
+    logger.info("Swept %s expired upload slot(s)", len(swept))
+    return len(swept)
@@ -0,0 +1,172 @@
+import os
+import json
+import base64
+import heapq
+import post_cache
+from db_connection import get_connection
+from s3_images import image_key_from_url
+from fashpo import logger
+
+# Keeps the IN (...) list and its packet size reasonable for very long id lists
+post_chunk_size = int(os.environ.get('POST_CHUNK_SIZE', '500'))
+
+POST_COLUMNS = ('id', 'image_url', 'image_variants', 'owner_id', 'description', 'category', 'gender_restriction')
+
+IMAGE_VARIANTS = ('thumb', 'medium', 'full')
+
+# Larger than any real id; a first page starts below it
+FIRST_PAGE = 2 ** 63 - 1
+# Branches per UNION ALL statement in fetch_recent_posts
+max_branches_per_query = int(os.environ.get('FEED_BRANCHES_PER_QUERY', '64'))
+
+
+def normalize_post_ids(post_ids):
+    # Accepts the comma-separated strings stored in Users/Categories as well as
+    # lists from request bodies, and drops the blanks a stray comma leaves behind.
+    if isinstance(post_ids, str):
+        post_ids = post_ids.split(',')
+    return [str(post_id).strip() for post_id in post_ids if str(post_id).strip()]
+
+
+def _query_posts(cur, post_ids, chunk_size):
+    rows_by_id = {}
+    for start in range(0, len(post_ids), chunk_size):
+        chunk = post_ids[start:start + chunk_size]
+        placeholders = ','.join(['%s'] * len(chunk))
+        cur.execute(f"""
+            SELECT {', '.join(POST_COLUMNS)}
+            FROM Posts
+            WHERE id IN ({placeholders}) AND deleted_at IS NULL
+        """, tuple(chunk))
+        for row in cur.fetchall():
+            post = row if isinstance(row, dict) else dict(zip(POST_COLUMNS, row))
+            rows_by_id[str(post['id'])] = post
+    post_cache.put_many(rows_by_id.values())
+    return rows_by_id
+
+
+def _order_posts(post_ids, rows_by_id):
+    missing = [post_id for post_id in dict.fromkeys(post_ids) if post_id not in rows_by_id]
+    if missing:
+        logger.info("Skipping %s missing or deleted post(s): %s", len(missing), missing)
+    return [rows_by_id[post_id] for post_id in post_ids if post_id in rows_by_id]
+
+
+def hydrate_posts(cur, post_ids, chunk_size=None):
+    # Fetch the rows for a whole page of posts: hot posts come from this
+    # container's post cache, the rest in one round trip per chunk instead of
+    # one SELECT per id. Results follow the order of post_ids; ids that are
+    # missing or soft-deleted are left out.
+    post_ids = normalize_post_ids(post_ids)
+    post_cache.check_version(cur)
+    rows_by_id, missing = post_cache.get_many(dict.fromkeys(post_ids))
+    if missing:
+        rows_by_id.update(_query_posts(cur, missing, chunk_size or post_chunk_size))
+    return _order_posts(post_ids, rows_by_id)
+
+
+def load_posts(post_ids, chunk_size=None):
+    # hydrate_posts for handlers that need nothing else from the database:
+    # when every post is cached and the cache's version stamp was checked
+    # recently, no connection is borrowed at all.
+    post_ids = normalize_post_ids(post_ids)
+    if post_cache.needs_version_check():
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                return hydrate_posts(cur, post_ids, chunk_size)
+    rows_by_id, missing = post_cache.get_many(dict.fromkeys(post_ids))
+    if missing:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                rows_by_id.update(_query_posts(cur, missing, chunk_size or post_chunk_size))
+    return _order_posts(post_ids, rows_by_id)
+
+
+def visible_gender_restrictions(gender):
+    # A viewer sees posts for their own gender and posts open to everyone
+    return list(dict.fromkeys([gender, 'All']))
+
+
+def fetch_recent_posts(cur, categories, gender, before_post_id, limit):
+    # The newest `limit` posts below before_post_id in each category that this
+    # gender may see, as one newest-first list per (category, restriction).
+    # Every branch is a short range scan on idx_posts_category_gender_id (the
+    # per-category recency index), so the cost is bounded by the number of
+    # branches times `limit`, however large the categories are.
+    branches = [(category, restriction) for category in dict.fromkeys(categories)
+                for restriction in visible_gender_restrictions(gender)]
+    branch_sql = f"""
+        (SELECT {', '.join(POST_COLUMNS)} FROM Posts
+         WHERE category = %s AND gender_restriction = %s AND id < %s AND deleted_at IS NULL
+         ORDER BY id DESC LIMIT %s)
+    """
+    streams = {}
+    # Stamp before rows, so a delete landing in between flushes them later
+    post_cache.check_version(cur)
+    for start in range(0, len(branches), max_branches_per_query):
+        chunk = branches[start:start + max_branches_per_query]
+        params = []
+        for category, restriction in chunk:
+            params += [category, restriction, before_post_id, limit]
+        cur.execute(' UNION ALL '.join([branch_sql] * len(chunk)), tuple(params))
+        posts = [dict(zip(POST_COLUMNS, row)) for row in cur.fetchall()]
+        for post in posts:
+            streams.setdefault((post['category'], post['gender_restriction']), []).append(post)
+        # Rows read for a listing are the ones about to be opened next
+        post_cache.put_many(posts)
+    # UNION ALL does not promise to keep each branch's order
+    return [sorted(stream, key=lambda post: post['id'], reverse=True) for stream in streams.values() if stream]
+
+
+def merge_recent(streams, limit):
+    # k-way merge of newest-first lists into the newest `limit` posts overall
+    merged = heapq.merge(*streams, key=lambda post: post['id'], reverse=True)
+    return [post for _, post in zip(range(limit), merged)]
+
+
+def get_image_variant(body):
+    # Grid views ask for 'thumb' or 'medium'; anything else gets the full image
+    variant = body.get('image_variant', 'full')
+    return variant if variant in IMAGE_VARIANTS else 'full'
+
+
+def post_image_key(post, variant='full'):
+    # S3 key of the requested rendition, falling back to the original upload
+    # for posts created before renditions were stored.
+    if variant != 'full' and post.get('image_variants'):
+        variants = post['image_variants']
+        if isinstance(variants, str):
+            variants = json.loads(variants)
+        if variants.get(variant):
+            return variants[variant]
+    return image_key_from_url(post['image_url'])
+
+
+def post_image_keys(post):
+    # Every S3 object stored for a post: the original plus any renditions
+    keys = [image_key_from_url(post['image_url'])]
+    variants = post.get('image_variants')
+    if variants:
+        if isinstance(variants, str):
+            variants = json.loads(variants)
+        keys += list(variants.values())
+    return [key for key in dict.fromkeys(keys) if key]
+
+
+def encode_cursor(last_id):
+    # Opaque to the client so the paging key can change without an app update.
+    # Used for any newest-first id-keyed list (posts, comments).
+    if last_id is None:
+        return None
+    payload = json.dumps({'id': int(last_id)}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(cursor):
+    # Returns the id to continue below, or None for the first page
+    if not cursor:
+        return None
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))['id'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
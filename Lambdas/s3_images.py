@@ -0,0 +1,147 @@
+import os
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import image_disk_cache
+from image_refs import CONTENT_PREFIX
+from fashpo import client_error, get_client, logger
+
+# Environment variables
+bucket_name = os.environ['BUCKET_NAME']
+# Width of the parallel fetch stage used by the feed handlers
+fetch_workers = int(os.environ.get('S3_FETCH_WORKERS', '8'))
+# Seconds allowed for a single GetObject before the image is treated as missing
+get_timeout = float(os.environ.get('S3_GET_TIMEOUT', '5'))
+max_pool_connections = max(int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '10')), fetch_workers)
+# 'url' returns presigned (or CDN) links, 'base64' inlines the image bytes like
+# older app versions expect. Requests can override it with an image_mode field.
+default_image_mode = os.environ.get('IMAGE_RESPONSE_MODE', 'base64')
+# When set, image URLs point at this CDN in front of the bucket instead of S3
+cdn_base_url = os.environ.get('IMAGE_CDN_BASE_URL', '').rstrip('/')
+presigned_url_ttl = int(os.environ.get('IMAGE_URL_TTL', '900'))
+# Lets the benchmarks and local runs point at an S3 stand-in (moto, MinIO, ...)
+endpoint_url = os.environ.get('S3_ENDPOINT_URL') or None
+
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def get_s3_client():
+    # Created on first use and kept for the life of the container, so boto3 is
+    # only imported by handlers that touch S3, and credentials, endpoints and
+    # the HTTP connection pool are resolved once.
+    return get_client('s3', endpoint_url=endpoint_url,
+                      max_pool_connections=max_pool_connections,
+                      connect_timeout=get_timeout,
+                      read_timeout=get_timeout)
+
+
+def image_key_from_url(image_url):
+    # Posts.image_url is stored as https://<bucket>.s3.amazonaws.com/<key>
+    if not image_url:
+        return None
+    return '/'.join(image_url.split('/')[3:])
+
+
+def get_image_url(image_key):
+    # Signing happens locally with the container's credentials; no S3 round trip
+    if not image_key:
+        return None
+    if cdn_base_url:
+        return f"{cdn_base_url}/{image_key}"
+    return get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket_name, 'Key': image_key},
+        ExpiresIn=presigned_url_ttl,
+    )
+
+
+def get_image_mode(body):
+    mode = body.get('image_mode') or default_image_mode
+    return 'url' if mode == 'url' else 'base64'
+
+
+def get_s3_image(image_key):
+    # Base64 of the image, served from the container's /tmp cache when it
+    # holds a current copy; otherwise downloaded and cached for next time.
+    if not image_key:
+        return None
+    cached = image_disk_cache.lookup(image_key)
+    # Content-addressed keys never change, so they are never revalidated
+    if cached and (cached[1] or image_key.startswith(CONTENT_PREFIX)):
+        image_base64 = image_disk_cache.read_base64(image_key)
+        if image_base64 is not None:
+            return image_base64
+    params = {'Bucket': bucket_name, 'Key': image_key}
+    if cached:
+        params['IfNoneMatch'] = cached[0]
+    try:
+        response = get_s3_client().get_object(**params)
+        data = response['Body'].read()
+    except client_error() as e:
+        if cached and e.response['Error'].get('Code') in ('304', 'NotModified'):
+            image_disk_cache.revalidated(image_key)
+            image_base64 = image_disk_cache.read_base64(image_key)
+            if image_base64 is not None:
+                return image_base64
+            # Evicted between the check and the read; fetch it unconditionally
+            image_disk_cache.invalidate(image_key)
+            return get_s3_image(image_key)
+        logger.error("Failed to fetch image from S3 with key: %s: %s", image_key, e.response['Error'])
+        return None
+    except Exception as e:
+        logger.error("Unexpected error fetching image from S3 with key: %s: %s", image_key, e)
+        return None
+    image_disk_cache.store(image_key, response.get('ETag'), data)
+    return base64.b64encode(data).decode('utf-8')
+
+
+def _get_executor():
+    # Kept for the life of the container like the client; a timed out fetch
+    # can finish in the background without holding up the response.
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='s3-fetch')
+    return _executor
+
+
+def fetch_images_base64(image_keys):
+    # Fetch and encode a whole page of images concurrently. The result lines
+    # up with image_keys; an image that is missing, fails or times out is None,
+    # exactly like get_s3_image, so callers keep their skip-if-missing logic.
+    if not image_keys:
+        return []
+    # Posts sharing a photo share its key, so each image is fetched once per page
+    unique_keys = list(dict.fromkeys(image_keys))
+    if len(unique_keys) == 1:
+        return [get_s3_image(unique_keys[0])] * len(image_keys)
+
+    get_s3_client()  # create the shared client before the threads race for it
+    executor = _get_executor()
+    futures = {image_key: executor.submit(get_s3_image, image_key) for image_key in unique_keys}
+
+    # One deadline for the whole page: waiting on each future in turn would
+    # restart the clock every time and let a slow page take N x get_timeout
+    done, _ = wait(futures.values(), timeout=get_timeout)
+    images = {}
+    for image_key, future in futures.items():
+        if future in done:
+            images[image_key] = future.result()
+        else:
+            future.cancel()
+            logger.error("Timed out fetching image from S3 with key: %s", image_key)
+            images[image_key] = None
+    return [images[image_key] for image_key in image_keys]
+
+
+def resolve_images(image_keys, mode):
+    # One dict per key to merge into the response item: {'image_url': ...} in
+    # url mode, {'image_base64': ...} in base64 mode, or None if the image is
+    # unavailable and the item should be skipped.
+    if mode == 'url':
+        return [{'image_url': get_image_url(image_key)} if image_key else None for image_key in image_keys]
+    return [{'image_base64': image_base64} if image_base64 else None
+            for image_base64 in fetch_images_base64(image_keys)]
@@ -0,0 +1,100 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from fashpo import logger
+
+# Comma-separated signing keys. The first one signs new tokens; all of them are
+# accepted, so a key can be rotated by prepending the new one and dropping the
+# old one once its tokens have expired.
+signing_keys = [key.encode('utf-8') for key in os.environ.get('SESSION_TOKEN_SECRET', '').split(',') if key]
+# Seconds a token stays valid after login
+token_ttl = int(os.environ.get('SESSION_TOKEN_TTL', '86400'))
+# Until every app version sends a token, handlers only check the ones they get
+token_required = os.environ.get('SESSION_TOKEN_REQUIRED', 'false').lower() == 'true'
+
+# Requiring tokens that nobody can issue would lock every user out; refuse to
+# start so the bad deploy shows up straight away
+if token_required and not signing_keys:
+    raise RuntimeError("SESSION_TOKEN_REQUIRED is set but SESSION_TOKEN_SECRET is not")
+
+
+class InvalidSessionToken(ValueError):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _signature(key, payload):
+    return hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_token(user_id, now=None):
+    # "<payload>.<signature>", both base64url. The payload is readable by the
+    # client but cannot be changed without the signing key.
+    # Returns (None, None) when no key is configured: tokens are optional
+    # until SESSION_TOKEN_REQUIRED is set, so login keeps working without one.
+    if not signing_keys:
+        logger.warning("SESSION_TOKEN_SECRET is not set, logging in without a session token")
+        return None, None
+    issued_at = int(now if now is not None else time.time())
+    claims = {'uid': int(user_id), 'iat': issued_at, 'exp': issued_at + token_ttl}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f"{payload}.{_b64encode(_signature(signing_keys[0], payload))}", claims['exp']
+
+
+def verify_token(token, now=None):
+    # Returns the token's claims, or raises InvalidSessionToken. One HMAC per
+    # configured key and no database access.
+    try:
+        payload, signature = token.split('.')
+        signature = _b64decode(signature)
+        # Tokens are base64url throughout; anything else cannot be signed.
+        # UnicodeEncodeError is a ValueError, so it is rejected here too.
+        payload.encode('ascii')
+    except (AttributeError, ValueError) as e:
+        raise InvalidSessionToken("Malformed session token") from e
+
+    if not any(hmac.compare_digest(signature, _signature(key, payload)) for key in signing_keys):
+        raise InvalidSessionToken("Bad session token signature")
+
+    claims = json.loads(_b64decode(payload))
+    if claims['exp'] <= (now if now is not None else time.time()):
+        raise InvalidSessionToken("Session token expired")
+    return claims
+
+
+def get_bearer_token(event):
+    # API Gateway passes headers through as sent, so match the name case-insensitively
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'authorization' and value and value.startswith('Bearer '):
+            return value[len('Bearer '):].strip()
+    return None
+
+
+def check_session(event, user_id):
+    # For handlers acting on a client-supplied user id. Returns None when the
+    # caller may act as user_id, otherwise the 401 response to send back.
+    token = get_bearer_token(event)
+    if token is None:
+        if not token_required:
+            return None
+        message = 'Missing session token'
+    else:
+        try:
+            if str(verify_token(token)['uid']) == str(user_id):
+                return None
+            message = 'Session token does not match user'
+        except InvalidSessionToken as e:
+            message = str(e)
+
+    logger.warning("Rejected request for user %s: %s", user_id, message)
+    return {'statusCode': 401, 'body': json.dumps({'message': message})}
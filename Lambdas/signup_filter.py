@@ -0,0 +1,167 @@
+import os
+import math
+import time
+import hashlib
+import threading
+import unicodedata
+import pymysql
+from db_connection import get_connection
+from fashpo import logger
+
+# Per-container Bloom filters of the usernames and emails in Users, so the
+# signup screens' availability checks can answer "available" without a query.
+# A filter never misses a value it was given; a value it reports as possibly
+# present falls through to the indexed lookup in the handler.
+#
+# Each filter is built on first use from one streamed scan of the column and
+# then caught up by id every SIGNUP_FILTER_REFRESH seconds, which only reads
+# users created since. Users rows are never renamed, so the id is enough.
+# Ids are handed out at insert but become visible at commit, so a signup can
+# appear below the highest id already read; each catch-up re-reads the last
+# SIGNUP_FILTER_CATCHUP_MARGIN ids, and the filter is rebuilt from scratch
+# every SIGNUP_FILTER_REBUILD seconds in case a signup took longer than that.
+# That catch-up is the only way new signups reach a filter: CreateProfile
+# runs in its own containers, which never hold one. Within the window a name
+# just taken can still be reported available; CreateProfile looks the name
+# and email up again under a lock before it inserts.
+refresh_interval = float(os.environ.get('SIGNUP_FILTER_REFRESH', '30'))
+false_positive_rate = float(os.environ.get('SIGNUP_FILTER_FP_RATE', '0.01'))
+min_capacity = int(os.environ.get('SIGNUP_FILTER_MIN_CAPACITY', '10000'))
+catch_up_margin = int(os.environ.get('SIGNUP_FILTER_CATCHUP_MARGIN', '1000'))
+rebuild_interval = float(os.environ.get('SIGNUP_FILTER_REBUILD', '3600'))
+# Room for growth before the filter is rebuilt bigger
+growth_factor = 1.5
+
+COLUMNS = ('username', 'email')
+
+_filters = {}
+_lock = threading.Lock()
+
+_stats = {
+    'definitely_absent': 0,  # answered without a query
+    'fallthroughs': 0,       # possibly present, checked in MySQL
+    'false_positives': 0,    # fell through but MySQL had no match
+    'builds': 0,
+    'refreshes': 0,
+}
+
+
+def normalize(value):
+    # Fold the differences MySQL's case- and accent-insensitive collations
+    # ignore, so values the database treats as equal land on the same bits
+    value = unicodedata.normalize('NFKD', str(value).strip())
+    return ''.join(c for c in value if not unicodedata.combining(c)).casefold()
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(normalize(value).encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class _ColumnFilter:
+    def __init__(self, bloom, max_id):
+        self.bloom = bloom
+        self.max_id = max_id
+        self.built_at = self.checked_at = time.monotonic()
+
+
+def _build(conn, column):
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM Users")
+    count, max_id = cur.fetchone()
+    cur.close()
+    bloom = BloomFilter(max(count * growth_factor, min_capacity), false_positive_rate)
+
+    # Streamed so a large Users table is never held in memory at once
+    cur = conn.cursor(pymysql.cursors.SSCursor)
+    cur.execute(f"SELECT {column} FROM Users WHERE id <= %s", (max_id,))
+    while True:
+        rows = cur.fetchmany(5000)
+        if not rows:
+            break
+        for (value,) in rows:
+            if value:
+                bloom.add(value)
+    cur.close()
+    _stats['builds'] += 1
+    logger.info("Built %s filter from %s user(s), %s bytes", column, bloom.count, len(bloom.bits))
+    return _ColumnFilter(bloom, max_id)
+
+
+def _catch_up(conn, column, column_filter):
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, {column} FROM Users WHERE id > %s ORDER BY id",
+                (column_filter.max_id - catch_up_margin,))
+    for user_id, value in cur.fetchall():
+        # Values re-read from the margin are usually present already; adding
+        # them again would only inflate the count towards a rebuild
+        if value and value not in column_filter.bloom:
+            column_filter.bloom.add(value)
+        column_filter.max_id = max(column_filter.max_id, user_id)
+    cur.close()
+    column_filter.checked_at = time.monotonic()
+    _stats['refreshes'] += 1
+
+
+def _get_filter(column):
+    with _lock:
+        column_filter = _filters.get(column)
+        if column_filter is not None and time.monotonic() - column_filter.checked_at < refresh_interval:
+            return column_filter
+        with get_connection() as conn:
+            if (column_filter is None or column_filter.bloom.count >= column_filter.bloom.capacity
+                    or time.monotonic() - column_filter.built_at >= rebuild_interval):
+                column_filter = _build(conn, column)
+            else:
+                _catch_up(conn, column, column_filter)
+        _filters[column] = column_filter
+        return column_filter
+
+
+def might_exist(column, value):
+    # False means no user has this username/email; True means ask MySQL. If
+    # the filter cannot be loaded every check falls through.
+    try:
+        column_filter = _get_filter(column)
+    except pymysql.MySQLError as e:
+        logger.warning("Signup filter unavailable, checking MySQL: %s", e)
+        return True
+    if value in column_filter.bloom:
+        with _lock:
+            _stats['fallthroughs'] += 1
+        return True
+    with _lock:
+        _stats['definitely_absent'] += 1
+    return False
+
+
+def record_result(exists):
+    # Called by the handlers after a fall-through lookup
+    if not exists:
+        with _lock:
+            _stats['false_positives'] += 1
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats.update({f'{column}_entries': column_filter.bloom.count for column, column_filter in _filters.items()})
+    return stats
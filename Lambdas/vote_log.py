@@ -0,0 +1,86 @@
+import os
+from fashpo import logger
+
+# Write-behind vote tallies. A vote that changes a ClothingVotes row appends
+# a +1/-1 event to ClothingVoteEvents (migration 010) instead of updating
+# ClothingArticles, so concurrent votes on one article only ever insert. The
+# compacted counters on ClothingArticles plus the events not yet folded into
+# them give the exact tally; compact() moves events into the counters.
+
+# Events folded per compaction transaction
+compaction_batch_size = int(os.environ.get('VOTE_COMPACTION_BATCH', '1000'))
+
+# ClothingArticles counter and event column for each kind of vote
+VOTE_COLUMNS = {
+    'up': ('up_vote_count', 'up_delta'),
+    'down': ('down_vote_count', 'down_delta'),
+}
+
+# Exact tallies for the ClothingArticles row aliased `a`: the compacted
+# counter plus the article's pending events, a short range on
+# idx_clothing_vote_events_clothing. Both come from the same statement, so a
+# compaction committing meanwhile is seen either entirely or not at all.
+TALLY_COLUMNS = """
+    GREATEST(a.up_vote_count + COALESCE((SELECT SUM(e.up_delta) FROM ClothingVoteEvents e
+                                         WHERE e.clothing_id = a.id), 0), 0) AS up_votes,
+    GREATEST(a.down_vote_count + COALESCE((SELECT SUM(e.down_delta) FROM ClothingVoteEvents e
+                                           WHERE e.clothing_id = a.id), 0), 0) AS down_votes
+"""
+
+
+def record_vote(cur, clothing_id, vote_type, delta):
+    event_column = VOTE_COLUMNS[vote_type][1]
+    cur.execute(f"INSERT INTO ClothingVoteEvents (clothing_id, {event_column}) VALUES (%s, %s)",
+                (clothing_id, delta))
+
+
+def read_tallies(cur, clothing_id):
+    # (up votes, down votes), or None if the article does not exist
+    cur.execute(f"SELECT {TALLY_COLUMNS} FROM ClothingArticles a WHERE a.id = %s", (clothing_id,))
+    row = cur.fetchone()
+    return (int(row[0]), int(row[1])) if row else None
+
+
+def compact(cur, batch_size=None):
+    # Fold the oldest events into the counters and delete them, in the
+    # caller's transaction. The batch is picked with a plain read, which takes
+    # no locks, and then only those rows are locked by primary key. A locking
+    # ORDER BY id LIMIT scan would also lock the gap after the newest event
+    # and stall every ClothingClick insert until the commit. Events inserted
+    # meanwhile are left for the next batch, and rows another compaction
+    # already deleted are skipped, so nothing is lost or counted twice.
+    # Returns the number of events folded.
+    cur.execute("SELECT id FROM ClothingVoteEvents ORDER BY id LIMIT %s",
+                (batch_size or compaction_batch_size,))
+    event_ids = [row[0] for row in cur.fetchall()]
+    if not event_ids:
+        return 0
+    placeholders = ','.join(['%s'] * len(event_ids))
+    cur.execute(f"""
+        SELECT id, clothing_id, up_delta, down_delta FROM ClothingVoteEvents
+        WHERE id IN ({placeholders})
+        FOR UPDATE
+    """, tuple(event_ids))
+    events = cur.fetchall()
+    if not events:
+        return 0
+
+    totals = {}
+    for _, clothing_id, up_delta, down_delta in events:
+        up, down = totals.get(clothing_id, (0, 0))
+        totals[clothing_id] = (up + up_delta, down + down_delta)
+
+    # One UPDATE per article however many votes it received; ids in order so
+    # concurrent compactions lock rows in the same sequence
+    cur.executemany("""
+        UPDATE ClothingArticles
+        SET up_vote_count = GREATEST(up_vote_count + %s, 0),
+            down_vote_count = GREATEST(down_vote_count + %s, 0)
+        WHERE id = %s
+    """, [(up, down, clothing_id) for clothing_id, (up, down) in sorted(totals.items()) if up or down])
+
+    placeholders = ','.join(['%s'] * len(events))
+    cur.execute(f"DELETE FROM ClothingVoteEvents WHERE id IN ({placeholders})",
+                tuple(event[0] for event in events))
+    logger.info("Folded %s vote event(s) into %s article(s)", len(events), len(totals))
+    return len(events)
@@ -0,0 +1,59 @@
+import os
+import sys
+import glob
+import json
+import argparse
+import statistics
+import subprocess
+
+# Cold-start cost of each handler: a fresh interpreter imports the module
+# (which is what Lambda's init phase does) and reports how long that took and
+# whether boto3 got loaded. Nothing connects to MySQL or AWS.
+#
+#   python benchmarks/cold_start_benchmark.py --runs 5
+#   python benchmarks/cold_start_benchmark.py --handlers PullCategories CreatePost
+
+LAMBDAS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Lambdas'))
+# Shared modules rather than entry points
+NOT_HANDLERS = {'db_connection', 'fashpo', 'posts', 'post_cache', 'image_disk_cache', 's3_images', 'image_variants',
+                'category_catalog', 'session_tokens', 'post_uploads', 'image_refs', 'post_state',
+                'vote_log', 'signup_filter', 'test'}
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per handler")
+parser.add_argument('--handlers', nargs='+', help="Only these handler modules")
+args = parser.parse_args()
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{'ms': elapsed, 'boto3': 'boto3' in sys.modules, 'pymysql': 'pymysql' in sys.modules}}))
+"""
+
+probe_env = dict(os.environ, PYTHONPATH=LAMBDAS, PYTHONDONTWRITEBYTECODE='0',
+                 AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+for name in ('DB_HOST', 'DB_NAME', 'DB_USER', 'DB_PASS', 'BUCKET_NAME'):
+    probe_env.setdefault(name, 'unused')
+
+handlers = args.handlers or sorted(
+    os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(LAMBDAS, '*.py'))
+    if os.path.splitext(os.path.basename(path))[0] not in NOT_HANDLERS)
+
+print(f"{'handler':<28}  {'import p50 (ms)':>15}  {'min (ms)':>9}  {'boto3':>6}")
+for handler in handlers:
+    samples = []
+    for _ in range(args.runs + 1):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=handler)], env=probe_env,
+                                cwd=LAMBDAS, capture_output=True, text=True)
+        if output.returncode != 0:
+            samples = None
+            print(f"{handler:<28}  failed: {output.stderr.strip().splitlines()[-1]}")
+            break
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    if samples:
+        # The first run warms the OS page cache and writes .pyc files
+        timings = [sample['ms'] for sample in samples[1:]]
+        print(f"{handler:<28}  {statistics.median(timings):15.1f}  {min(timings):9.1f}  "
+              f"{'yes' if samples[-1]['boto3'] else 'no':>6}")
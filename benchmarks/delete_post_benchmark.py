@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+# DeletePost latency as the Users table grows, comparing the old full-table
+# CSV rewrite with the join-table deletes DeletePost now does.
+#
+# Needs a scratch MySQL database it is allowed to drop tables in:
+#
+#   DB_HOST=127.0.0.1 DB_USER=root DB_PASS=... DB_NAME=fashpo_bench \
+#       python benchmarks/delete_post_benchmark.py --sizes 10000 100000 1000000
+#
+# The legacy path reads every Users row, so at 1M users pass --skip-legacy
+# unless you are prepared to wait.
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Lambdas'))
+os.environ.setdefault('BUCKET_NAME', 'fashpo-bench')
+os.environ.pop('CLEANUP_FUNCTION_NAME', None)
+
+import json
+import pymysql
+import DeletePost
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+parser.add_argument('--posts', type=int, default=20000)
+parser.add_argument('--favorites-per-user', type=int, default=3)
+parser.add_argument('--deletes', type=int, default=50)
+parser.add_argument('--skip-legacy', action='store_true')
+args = parser.parse_args()
+
+SCHEMA = [
+    "DROP TABLE IF EXISTS Users, Posts, Categories, Comments, UserPosts, Favorites, "
+    "CategorySubscriptions, CategoryPosts, ClothingVotes",
+    """CREATE TABLE Users (id INT AUTO_INCREMENT PRIMARY KEY, username VARCHAR(64),
+                           user_posts TEXT, favorite_posts TEXT)""",
+    """CREATE TABLE Posts (id INT AUTO_INCREMENT PRIMARY KEY, owner_id INT, category VARCHAR(64),
+                           image_url VARCHAR(255), image_variants JSON NULL, image_hash CHAR(64) NULL,
+                           deleted_at DATETIME NULL)""",
+    "CREATE TABLE Categories (id INT AUTO_INCREMENT PRIMARY KEY, category_name VARCHAR(64), post_ids MEDIUMTEXT)",
+    "CREATE TABLE Comments (id INT AUTO_INCREMENT PRIMARY KEY, post_id INT, text TEXT)",
+]
+
+
+def execute_script(cur, path):
+    with open(path) as f:
+        for chunk in f.read().split(';'):
+            statement = '\n'.join(line for line in chunk.splitlines() if not line.strip().startswith('--'))
+            if statement.strip():
+                cur.execute(statement)
+
+
+def create_schema(conn):
+    with conn.cursor() as cur:
+        for statement in SCHEMA:
+            cur.execute(statement)
+        execute_script(cur, os.path.join(os.path.dirname(__file__), '..', 'migrations', '002_relation_tables.sql'))
+        categories = [(f"category_{i}", '') for i in range(20)]
+        cur.executemany("INSERT INTO Categories (category_name, post_ids) VALUES (%s, %s)", categories)
+        posts = [(1, f"category_{i % 20}", f"https://b.s3.amazonaws.com/post_{i}/uploaded_image.jpg")
+                 for i in range(args.posts)]
+        cur.executemany("INSERT INTO Posts (owner_id, category, image_url) VALUES (%s, %s, %s)", posts)
+        cur.execute("INSERT INTO CategoryPosts (category_id, post_id) SELECT (id % 20) + 1, id FROM Posts")
+        cur.execute("""UPDATE Categories c SET post_ids =
+                       (SELECT GROUP_CONCAT(post_id) FROM CategoryPosts WHERE category_id = c.id)""")
+    conn.commit()
+
+
+def grow_users(conn, current, target):
+    batch = 5000
+    with conn.cursor() as cur:
+        for start in range(current, target, batch):
+            users, user_posts, favorites = [], [], []
+            for user_id in range(start + 1, min(start + batch, target) + 1):
+                own = random.randint(1, args.posts)
+                favs = random.sample(range(1, args.posts + 1), args.favorites_per_user)
+                users.append((user_id, f"user_{user_id}", str(own), ','.join(map(str, favs))))
+                user_posts.append((user_id, own))
+                favorites += [(user_id, 'post', post_id) for post_id in favs]
+            cur.executemany("INSERT INTO Users (id, username, user_posts, favorite_posts) VALUES (%s, %s, %s, %s)",
+                            users)
+            cur.executemany("INSERT INTO UserPosts (user_id, post_id) VALUES (%s, %s)", user_posts)
+            cur.executemany("INSERT IGNORE INTO Favorites (user_id, item_type, item_id) VALUES (%s, %s, %s)",
+                            favorites)
+            conn.commit()
+
+
+def remove_id_from_list(id_list, id_to_remove):
+    id_list = id_list.split(',') if id_list else []
+    return ','.join(i for i in id_list if i.strip() and i.strip() != str(id_to_remove))
+
+
+def legacy_delete(conn, post_id):
+    # What DeletePost did before the join tables
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, user_posts, favorite_posts FROM Users")
+        for user_id, user_posts, favorite_posts in cur.fetchall():
+            new_user_posts = remove_id_from_list(user_posts, post_id)
+            new_favorite_posts = remove_id_from_list(favorite_posts, post_id)
+            if user_posts != new_user_posts or favorite_posts != new_favorite_posts:
+                cur.execute("UPDATE Users SET user_posts = %s, favorite_posts = %s WHERE id = %s",
+                            (new_user_posts, new_favorite_posts, user_id))
+        cur.execute("SELECT id, post_ids FROM Categories")
+        for category_id, post_ids in cur.fetchall():
+            new_post_ids = remove_id_from_list(post_ids, post_id)
+            if post_ids != new_post_ids:
+                cur.execute("UPDATE Categories SET post_ids = %s WHERE id = %s", (new_post_ids, category_id))
+        cur.execute("UPDATE Posts SET deleted_at = NOW() WHERE id = %s", (post_id,))
+    conn.commit()
+
+
+def timed(fn, post_ids):
+    timings = []
+    for post_id in post_ids:
+        started = time.perf_counter()
+        fn(post_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def handler_delete(post_id):
+    response = DeletePost.lambda_handler({'body': json.dumps({'id': post_id})}, None)
+    assert response['statusCode'] == 200, response
+
+
+conn = pymysql.connect(host=os.environ['DB_HOST'], user=os.environ['DB_USER'], passwd=os.environ['DB_PASS'],
+                       db=os.environ['DB_NAME'])
+create_schema(conn)
+candidates = list(range(1, args.posts + 1))
+random.shuffle(candidates)
+
+users = 0
+print(f"{'users':>10}  {'join tables p50/max (ms)':>26}  {'legacy p50/max (ms)':>22}")
+for size in sorted(args.sizes):
+    grow_users(conn, users, size)
+    users = size
+    new_p50, new_max = timed(handler_delete, [candidates.pop() for _ in range(args.deletes)])
+    if args.skip_legacy:
+        legacy = 'skipped'
+    else:
+        legacy_p50, legacy_max = timed(lambda post_id: legacy_delete(conn, post_id),
+                                       [candidates.pop() for _ in range(min(args.deletes, 5))])
+        legacy = f"{legacy_p50:9.1f} / {legacy_max:9.1f}"
+    print(f"{size:>10}  {new_p50:12.2f} / {new_max:10.2f}  {legacy:>22}")
+
+conn.close()
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+# Per-image latency of get_s3_image for a popular set of images: the first
+# pass downloads and fills the /tmp cache, the second is served from disk, the
+# third revalidates every entry with a conditional GET (304, no body).
+#
+# Needs a local S3 stand-in, like s3_client_benchmark.py:
+#
+#   pip install boto3 'moto[server]'
+#   python benchmarks/image_disk_cache_benchmark.py --images 200
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Lambdas'))
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--endpoint-url', default=None)
+parser.add_argument('--images', type=int, default=100)
+parser.add_argument('--image-size', type=int, default=200 * 1024)
+parser.add_argument('--bucket', default='fashpo-bench')
+args = parser.parse_args()
+
+server = None
+if args.endpoint_url is None:
+    import logging
+    from moto.server import ThreadedMotoServer
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    args.endpoint_url = f"http://{host}:{port}"
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['BUCKET_NAME'] = args.bucket
+os.environ['S3_ENDPOINT_URL'] = args.endpoint_url
+os.environ['IMAGE_DISK_CACHE_DIR'] = os.path.join(tempfile.gettempdir(), 'fashpo-images-bench')
+
+import image_disk_cache
+import s3_images
+
+setup_client = s3_images.get_s3_client()
+setup_client.create_bucket(Bucket=args.bucket)
+keys = [f"post_{i}/uploaded_image.jpg" for i in range(args.images)]
+payload = os.urandom(args.image_size)
+for key in keys:
+    setup_client.put_object(Bucket=args.bucket, Key=key, Body=payload)
+
+
+def measure():
+    timings = []
+    for key in keys:
+        started = time.perf_counter()
+        assert s3_images.get_s3_image(key)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} mean {statistics.mean(timings):7.2f} ms   "
+          f"p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+print(f"{args.images} images of {args.image_size // 1024} KiB from {args.endpoint_url}")
+report("download (cold)", measure())
+report("disk cache (warm)", measure())
+image_disk_cache.revalidate_after = 0
+report("revalidate (304)", measure())
+print(image_disk_cache.get_stats())
+
+if server is not None:
+    server.stop()
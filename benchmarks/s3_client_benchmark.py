@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# Per-image latency of get_s3_image with a fresh boto3 client per call (the old
+# handler behaviour) versus the shared client from s3_images.
+#
+# Needs a local S3 stand-in. Either pass --endpoint-url for one that is already
+# running (MinIO, `moto_server -p 5000`, ...) or install moto and let the script
+# start an in-process server:
+#
+#   pip install boto3 'moto[server]'
+#   python benchmarks/s3_client_benchmark.py --images 200
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Lambdas'))
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--endpoint-url', default=None)
+parser.add_argument('--images', type=int, default=100)
+parser.add_argument('--image-size', type=int, default=200 * 1024)
+parser.add_argument('--bucket', default='fashpo-bench')
+args = parser.parse_args()
+
+server = None
+if args.endpoint_url is None:
+    import logging
+    from moto.server import ThreadedMotoServer
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    args.endpoint_url = f"http://{host}:{port}"
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['BUCKET_NAME'] = args.bucket
+os.environ['S3_ENDPOINT_URL'] = args.endpoint_url
+
+import base64
+import boto3
+import s3_images
+
+setup_client = s3_images.get_s3_client()
+setup_client.create_bucket(Bucket=args.bucket)
+keys = [f"post_{i}/uploaded_image.jpg" for i in range(args.images)]
+payload = os.urandom(args.image_size)
+for key in keys:
+    setup_client.put_object(Bucket=args.bucket, Key=key, Body=payload)
+
+
+def get_s3_image_fresh_client(image_key):
+    # What every handler used to do: build a new client for each image
+    s3 = boto3.client('s3', endpoint_url=args.endpoint_url)
+    response = s3.get_object(Bucket=args.bucket, Key=image_key)
+    return base64.b64encode(response['Body'].read()).decode('utf-8')
+
+
+def measure(fetch):
+    timings = []
+    for key in keys:
+        started = time.perf_counter()
+        fetch(key)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} mean {statistics.mean(timings):7.2f} ms   "
+          f"p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+print(f"{args.images} images of {args.image_size // 1024} KiB from {args.endpoint_url}")
+report("client per image", measure(get_s3_image_fresh_client))
+report("shared client", measure(s3_images.get_s3_image))
+
+if server is not None:
+    server.stop()
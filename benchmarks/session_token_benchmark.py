@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import argparse
+
+# Single-threaded throughput of a password login (VerifyUserCredentials'
+# 100,000-iteration PBKDF2) versus checking a session token, i.e. operations
+# per second on one vCPU. No database or network is involved; both sides
+# are measured on the same in-memory inputs.
+#
+#   python benchmarks/session_token_benchmark.py --seconds 3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Lambdas'))
+# db_connection reads these at import time; nothing here connects
+for name in ('DB_HOST', 'DB_NAME', 'DB_USER', 'DB_PASS'):
+    os.environ.setdefault(name, 'unused')
+os.environ.setdefault('SESSION_TOKEN_SECRET', 'benchmark-secret')
+
+import CreateProfile
+import VerifyUserCredentials
+import session_tokens
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--seconds', type=float, default=2.0, help="Time spent on each measurement")
+args = parser.parse_args()
+
+
+def throughput(fn):
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    elapsed = time.perf_counter() - started
+    return calls / elapsed, elapsed / calls * 1e6
+
+
+stored_password = CreateProfile.hash_password('correct horse battery staple')
+token, _ = session_tokens.issue_token(42)
+
+results = [
+    ('login (PBKDF2-SHA256, 100k iterations)',
+     throughput(lambda: VerifyUserCredentials.validate_password(stored_password, 'correct horse battery staple'))),
+    ('issue session token', throughput(lambda: session_tokens.issue_token(42))),
+    ('verify session token', throughput(lambda: session_tokens.verify_token(token))),
+]
+
+print(f"{'operation':<42}  {'ops/s per vCPU':>15}  {'us/op':>10}")
+for name, (ops, micros) in results:
+    print(f"{name:<42}  {ops:15,.0f}  {micros:10.1f}")
+print(f"token verify is {results[2][1][0] / results[0][1][0]:,.0f}x the login rate")
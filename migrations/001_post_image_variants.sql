@@ -0,0 +1,5 @@
+-- S3 keys of the renditions CreatePost stores for each post, e.g.
+-- {"thumb": "post_12/thumb.jpg", "medium": "post_12/medium.jpg", "full": "post_12/uploaded_image.jpg"}
+-- NULL for posts created before variants existed; readers fall back to image_url.
+ALTER TABLE Posts
+    ADD COLUMN image_variants JSON NULL AFTER image_url;
@@ -0,0 +1,58 @@
+-- Indexed join tables replacing the comma-separated id columns
+--   Users.user_posts, Users.favorite_posts, Users.favorite_clothing,
+--   Users.user_categories, Categories.post_ids, Posts.comments,
+--   ClothingArticles.up_votes/down_votes/favorites
+-- Existing data is copied over by migrations/backfill_relations.py. The old
+-- columns are left in place (and no longer written) until the backfill has
+-- been verified.
+
+-- Users.user_posts
+CREATE TABLE UserPosts (
+    user_id INT NOT NULL,
+    post_id INT NOT NULL,
+    PRIMARY KEY (user_id, post_id),
+    KEY idx_user_posts_post (post_id)
+);
+
+-- Users.favorite_posts, Users.favorite_clothing and ClothingArticles.favorites.
+-- id keeps the order items were favorited in.
+CREATE TABLE Favorites (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    item_type ENUM('post', 'clothing') NOT NULL,
+    item_id INT NOT NULL,
+    UNIQUE KEY uq_favorites_user_item (user_id, item_type, item_id),
+    KEY idx_favorites_item (item_type, item_id)
+);
+
+-- Users.user_categories. id keeps the order categories were subscribed in.
+CREATE TABLE CategorySubscriptions (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    category_id INT NOT NULL,
+    UNIQUE KEY uq_category_subscriptions_user_category (user_id, category_id),
+    KEY idx_category_subscriptions_category (category_id)
+);
+
+-- Categories.post_ids
+CREATE TABLE CategoryPosts (
+    category_id INT NOT NULL,
+    post_id INT NOT NULL,
+    PRIMARY KEY (category_id, post_id),
+    KEY idx_category_posts_post (post_id)
+);
+
+-- ClothingArticles.up_votes / down_votes
+CREATE TABLE ClothingVotes (
+    clothing_id INT NOT NULL,
+    user_id INT NOT NULL,
+    vote_type ENUM('up', 'down') NOT NULL,
+    PRIMARY KEY (clothing_id, user_id, vote_type),
+    KEY idx_clothing_votes_user (user_id)
+);
+
+-- Posts.comments: Comments already carries post_id, it only needs an index.
+-- Deleting a comment now sets deleted_at instead of editing the id list.
+ALTER TABLE Comments
+    ADD COLUMN deleted_at DATETIME NULL,
+    ADD KEY idx_comments_post (post_id, id);
@@ -0,0 +1,5 @@
+-- Serves category_view's keyset pagination:
+--   WHERE category = ? AND gender_restriction = ? AND id < ? ORDER BY id DESC LIMIT ?
+-- so a page is a short index range scan wherever the cursor is.
+ALTER TABLE Posts
+    ADD KEY idx_posts_category_gender_id (category, gender_restriction, id);
@@ -0,0 +1,20 @@
+-- Stored vote tallies on ClothingArticles, kept in step with ClothingVotes by
+-- ClothingClick in the same transaction as each vote change, so reading or
+-- casting a vote no longer counts the article's voters.
+ALTER TABLE ClothingArticles
+    ADD COLUMN up_vote_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN down_vote_count INT NOT NULL DEFAULT 0;
+
+-- Seed the counters from the votes already recorded. Run after the
+-- ClothingVotes backfill and before deploying the ClothingClick that
+-- maintains them; re-running it is safe and also repairs any drift.
+UPDATE ClothingArticles a
+LEFT JOIN (
+    SELECT clothing_id,
+           SUM(vote_type = 'up') AS up_votes,
+           SUM(vote_type = 'down') AS down_votes
+    FROM ClothingVotes
+    GROUP BY clothing_id
+) v ON v.clothing_id = a.id
+SET a.up_vote_count = COALESCE(v.up_votes, 0),
+    a.down_vote_count = COALESCE(v.down_votes, 0);
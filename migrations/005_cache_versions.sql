@@ -0,0 +1,20 @@
+-- Version stamps for data the Lambdas cache in memory. A reader whose cache
+-- TTL has expired compares the stored stamp with the one it loaded at and
+-- only re-reads the data when the stamp has moved.
+CREATE TABLE CacheVersions (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO CacheVersions (name, version) VALUES ('categories', 1);
+
+-- Categories are mostly edited by hand, so the stamp is bumped by triggers
+-- rather than relying on every writer to remember.
+CREATE TRIGGER categories_after_insert AFTER INSERT ON Categories
+    FOR EACH ROW UPDATE CacheVersions SET version = version + 1 WHERE name = 'categories';
+
+CREATE TRIGGER categories_after_update AFTER UPDATE ON Categories
+    FOR EACH ROW UPDATE CacheVersions SET version = version + 1 WHERE name = 'categories';
+
+CREATE TRIGGER categories_after_delete AFTER DELETE ON Categories
+    FOR EACH ROW UPDATE CacheVersions SET version = version + 1 WHERE name = 'categories';
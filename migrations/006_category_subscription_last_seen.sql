@@ -0,0 +1,10 @@
+-- Newest post in the category the subscriber has already been shown, so
+-- MyCategories can report how many posts are new since their last visit.
+-- category_view moves it forward when the first page of a category is opened.
+ALTER TABLE CategorySubscriptions
+    ADD COLUMN last_seen_post_id INT NOT NULL DEFAULT 0;
+
+-- Existing subscribers start with nothing unseen rather than the whole category
+UPDATE CategorySubscriptions s
+SET s.last_seen_post_id = COALESCE(
+    (SELECT MAX(cp.post_id) FROM CategoryPosts cp WHERE cp.category_id = s.category_id), 0);
@@ -0,0 +1,16 @@
+-- Upload slots handed out by RequestPostUpload. The client uploads the
+-- photo straight to S3 under image_key with the presigned POST it was given,
+-- then calls CreatePost with the upload id; post_id is set when that post is committed, so a slot can only ever
+-- produce one post. Slots still unused after expires_at are swept together
+-- with their S3 object by CleanupPostImages.
+CREATE TABLE PostUploads (
+    id CHAR(32) NOT NULL PRIMARY KEY,
+    owner_id INT NOT NULL,
+    image_key VARCHAR(255) NOT NULL,
+    content_type VARCHAR(64) NOT NULL,
+    max_bytes INT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    post_id INT NULL,
+    INDEX idx_post_uploads_unclaimed (post_id, expires_at)
+);
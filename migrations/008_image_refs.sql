@@ -0,0 +1,15 @@
+-- Content-addressed images: photos uploaded through CreatePost are stored
+-- once under images/<sha256>/ and shared by every post of the same photo.
+-- ref_count is the number of live (not deleted) posts using the hash; the
+-- objects are removed when it drops to zero. image_variants is NULL only
+-- while the first post of a hash is still uploading.
+CREATE TABLE ImageRefs (
+    content_hash CHAR(64) NOT NULL PRIMARY KEY,
+    image_variants TEXT NULL,
+    ref_count INT NOT NULL DEFAULT 0
+);
+
+-- Posts created before this keep their own post_<id>/ objects and no hash
+ALTER TABLE Posts
+    ADD COLUMN image_hash CHAR(64) NULL,
+    ADD INDEX idx_posts_image_hash (image_hash);
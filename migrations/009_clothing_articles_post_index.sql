@@ -0,0 +1,5 @@
+-- post_state reads the clothing articles of a whole feed page at once:
+--   WHERE a.post_id IN (...)
+-- so each post is an index range instead of a scan of every article.
+ALTER TABLE ClothingArticles
+    ADD KEY idx_clothing_articles_post (post_id, id);
@@ -0,0 +1,13 @@
+-- Append-only log of tally changes. ClothingClick inserts one row per vote
+-- that actually changed instead of updating the article's counters, so votes
+-- on a popular article no longer queue on its ClothingArticles row.
+-- CompactVoteEvents folds the log into up_vote_count / down_vote_count in
+-- batches and deletes what it folded; readers add the rows still waiting
+-- (see vote_log), so tallies are exact at any time.
+CREATE TABLE ClothingVoteEvents (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    clothing_id INT NOT NULL,
+    up_delta SMALLINT NOT NULL DEFAULT 0,
+    down_delta SMALLINT NOT NULL DEFAULT 0,
+    KEY idx_clothing_vote_events_clothing (clothing_id)
+);
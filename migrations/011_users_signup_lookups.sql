@@ -0,0 +1,6 @@
+-- CheckAvailability and CheckEmail look users up by username and email when
+-- the signup filter (signup_filter) reports a possible match. Skip whichever
+-- statement an existing unique key already covers.
+ALTER TABLE Users
+    ADD KEY idx_users_username (username),
+    ADD KEY idx_users_email (email);
@@ -0,0 +1,9 @@
+-- Stamp for post_cache (see 005 for CacheVersions). Reading containers check
+-- it every few seconds and drop their cached posts when it has moved, so a
+-- deleted post stops being served everywhere, not just in DeletePost's own
+-- container. Bumped by a trigger whenever a post is deleted or restored.
+INSERT INTO CacheVersions (name, version) VALUES ('posts', 1);
+
+CREATE TRIGGER posts_after_update AFTER UPDATE ON Posts
+    FOR EACH ROW UPDATE CacheVersions SET version = version + 1
+    WHERE name = 'posts' AND NOT (OLD.deleted_at <=> NEW.deleted_at);
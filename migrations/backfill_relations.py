@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import logging
+import argparse
+
+import pymysql
+
+# Copies the comma-separated id columns into the join tables created by
+# 002_relation_tables.sql, walking each source table in primary key order a
+# chunk at a time so it can run against the live database:
+#
+#   * every chunk is its own short transaction, so no long-held locks;
+#   * inserts are INSERT IGNORE, so the script is idempotent and can be
+#     stopped and restarted (use --start-id to resume) or re-run at will;
+#   * --sleep throttles it between chunks when the database is busy.
+#
+# The CSV columns are only the truth while the old handlers write them. Once
+# the new handlers are live nothing updates them, so copying from them again
+# would bring back every unfavorite, unsubscribe, vote removal and deleted
+# post made since. Rollout:
+#
+#   1. apply 002_relation_tables.sql and run this script against the live
+#      database (old handlers still deployed) to copy the bulk of the data;
+#   2. freeze writes: stop the old write handlers (e.g. reserved concurrency
+#      0) so the CSV columns stop changing;
+#   3. run it once more with --reconcile, which also deletes join rows that
+#      are no longer in the CSV, so removals made since step 1 are applied;
+#   4. seed the vote counters (the UPDATE in 004_clothing_vote_counts.sql);
+#   5. deploy the new handlers and lift the freeze.
+#
+# Never run this script again once step 5 is done.
+#
+# The comments pass infers deletions from ids missing from Posts.comments,
+# so it only touches comments up to --comments-cutoff-id and is skipped
+# without it. Pass SELECT MAX(id) FROM Comments taken during the freeze.
+#
+#   DB_HOST=... DB_USER=... DB_PASS=... DB_NAME=... \
+#       python migrations/backfill_relations.py --chunk-size 1000 --sleep 0.05
+#   # writes frozen:
+#   DB_HOST=... DB_USER=... DB_PASS=... DB_NAME=... \
+#       python migrations/backfill_relations.py --reconcile \
+#       --comments-cutoff-id <max comment id during the freeze>
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger()
+
+
+def split_ids(value):
+    # Same tolerance as the handlers had: ignore blanks and stray whitespace
+    if not value:
+        return []
+    ids = []
+    for item in value.split(','):
+        item = item.strip()
+        if item.isdigit():
+            ids.append(int(item))
+        elif item:
+            logger.warning(f"Skipping malformed id {item!r}")
+    return ids
+
+
+def delete_missing(cur, table, owner_column, owner_id, item_column, keep_ids, condition='', params=()):
+    # Reconcile: remove the owner's rows whose item is no longer in its CSV
+    sql = f"DELETE FROM {table} WHERE {owner_column} = %s{condition}"
+    if keep_ids:
+        sql += f" AND {item_column} NOT IN ({','.join(['%s'] * len(keep_ids))})"
+    return cur.execute(sql, (owner_id, *params, *keep_ids))
+
+
+def backfill_users(cur, rows, reconcile=False):
+    user_posts, favorites, subscriptions = [], [], []
+    removed = 0
+    for user_id, posts_csv, favorite_posts_csv, favorite_clothing_csv, categories_csv in rows:
+        post_ids, favorite_post_ids = split_ids(posts_csv), split_ids(favorite_posts_csv)
+        favorite_clothing_ids, category_ids = split_ids(favorite_clothing_csv), split_ids(categories_csv)
+        user_posts += [(user_id, post_id) for post_id in post_ids]
+        # Inserted in list order so Favorites.id / CategorySubscriptions.id keep it
+        favorites += [(user_id, 'post', post_id) for post_id in favorite_post_ids]
+        favorites += [(user_id, 'clothing', clothing_id) for clothing_id in favorite_clothing_ids]
+        subscriptions += [(user_id, category_id) for category_id in category_ids]
+        if reconcile:
+            removed += delete_missing(cur, 'UserPosts', 'user_id', user_id, 'post_id', post_ids)
+            removed += delete_missing(cur, 'Favorites', 'user_id', user_id, 'item_id', favorite_post_ids,
+                                      " AND item_type = %s", ('post',))
+            removed += delete_missing(cur, 'Favorites', 'user_id', user_id, 'item_id', favorite_clothing_ids,
+                                      " AND item_type = %s", ('clothing',))
+            removed += delete_missing(cur, 'CategorySubscriptions', 'user_id', user_id, 'category_id', category_ids)
+
+    if user_posts:
+        cur.executemany("INSERT IGNORE INTO UserPosts (user_id, post_id) VALUES (%s, %s)", user_posts)
+    if favorites:
+        cur.executemany("INSERT IGNORE INTO Favorites (user_id, item_type, item_id) VALUES (%s, %s, %s)", favorites)
+    if subscriptions:
+        cur.executemany("INSERT IGNORE INTO CategorySubscriptions (user_id, category_id) VALUES (%s, %s)",
+                        subscriptions)
+    return len(user_posts) + len(favorites) + len(subscriptions) + removed
+
+
+def backfill_categories(cur, rows, reconcile=False):
+    category_posts = []
+    removed = 0
+    for category_id, post_ids_csv in rows:
+        post_ids = split_ids(post_ids_csv)
+        category_posts += [(category_id, post_id) for post_id in post_ids]
+        if reconcile:
+            removed += delete_missing(cur, 'CategoryPosts', 'category_id', category_id, 'post_id', post_ids)
+    if category_posts:
+        cur.executemany("INSERT IGNORE INTO CategoryPosts (category_id, post_id) VALUES (%s, %s)", category_posts)
+    return len(category_posts) + removed
+
+
+def backfill_clothing(cur, rows, reconcile=False):
+    # Clothing favorites are also listed in Users.favorite_clothing. When
+    # reconciling, the users pass is the authority for them, so they are not
+    # re-inserted here after it removed them.
+    votes, favorites = [], []
+    removed = 0
+    for clothing_id, up_votes_csv, down_votes_csv, favorites_csv in rows:
+        up_voter_ids, down_voter_ids = split_ids(up_votes_csv), split_ids(down_votes_csv)
+        votes += [(clothing_id, user_id, 'up') for user_id in up_voter_ids]
+        votes += [(clothing_id, user_id, 'down') for user_id in down_voter_ids]
+        if reconcile:
+            removed += delete_missing(cur, 'ClothingVotes', 'clothing_id', clothing_id, 'user_id', up_voter_ids,
+                                      " AND vote_type = %s", ('up',))
+            removed += delete_missing(cur, 'ClothingVotes', 'clothing_id', clothing_id, 'user_id', down_voter_ids,
+                                      " AND vote_type = %s", ('down',))
+        else:
+            favorites += [(user_id, 'clothing', clothing_id) for user_id in split_ids(favorites_csv)]
+
+    if votes:
+        cur.executemany("INSERT IGNORE INTO ClothingVotes (clothing_id, user_id, vote_type) VALUES (%s, %s, %s)",
+                        votes)
+    if favorites:
+        cur.executemany("INSERT IGNORE INTO Favorites (user_id, item_type, item_id) VALUES (%s, %s, %s)", favorites)
+    return len(votes) + len(favorites) + removed
+
+
+def backfill_comments(cur, rows, cutoff_id):
+    # Comments rows already carry post_id. DeleteComment used to drop the id
+    # from Posts.comments and leave the row, so anything no longer listed is
+    # marked deleted instead. Only comments up to cutoff_id are considered:
+    # the CSV is frozen once the new handlers are live, so a newer comment
+    # missing from it has not been deleted.
+    deleted = 0
+    for post_id, comments_csv in rows:
+        comment_ids = split_ids(comments_csv)
+        if comment_ids:
+            placeholders = ','.join(['%s'] * len(comment_ids))
+            deleted += cur.execute(f"""
+                UPDATE Comments SET deleted_at = NOW()
+                WHERE post_id = %s AND id <= %s AND deleted_at IS NULL AND id NOT IN ({placeholders})
+            """, (post_id, cutoff_id, *comment_ids))
+        else:
+            deleted += cur.execute("""
+                UPDATE Comments SET deleted_at = NOW()
+                WHERE post_id = %s AND id <= %s AND deleted_at IS NULL
+            """, (post_id, cutoff_id))
+    return deleted
+
+
+SOURCES = {
+    'users': ('Users', 'id, user_posts, favorite_posts, favorite_clothing, user_categories', backfill_users),
+    'categories': ('Categories', 'id, post_ids', backfill_categories),
+    'clothing': ('ClothingArticles', 'id, up_votes, down_votes, favorites', backfill_clothing),
+    'comments': ('Posts', 'id, comments', backfill_comments),
+}
+
+
+def run(conn, source, chunk_size, sleep, start_id, **options):
+    table, columns, backfill = SOURCES[source]
+    last_id = start_id
+    total_rows = total_written = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {columns} FROM {table} WHERE id > %s ORDER BY id LIMIT %s", (last_id, chunk_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            written = backfill(cur, rows, **options)
+        conn.commit()
+
+        last_id = rows[-1][0]
+        total_rows += len(rows)
+        total_written += written
+        logger.info(f"{table}: processed through id {last_id} ({total_rows} rows, {total_written} relations)")
+        if sleep:
+            time.sleep(sleep)
+
+    logger.info(f"{table}: done, {total_rows} rows, {total_written} relations written")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill join tables from comma-separated id columns")
+    parser.add_argument('--source', choices=sorted(SOURCES), action='append',
+                        help="Only backfill these sources (default: all)")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between chunks")
+    parser.add_argument('--start-id', type=int, default=0, help="Resume after this source row id")
+    parser.add_argument('--reconcile', action='store_true',
+                        help="Also delete join rows missing from the CSV columns; only while writes are frozen, "
+                             "before the new handlers are deployed")
+    parser.add_argument('--comments-cutoff-id', type=int, default=None,
+                        help="Largest Comments.id from before the new handlers were deployed; "
+                             "the comments pass is skipped without it")
+    args = parser.parse_args()
+
+    conn = pymysql.connect(host=os.environ['DB_HOST'], user=os.environ['DB_USER'], passwd=os.environ['DB_PASS'],
+                           db=os.environ['DB_NAME'], connect_timeout=5)
+    try:
+        for source in args.source or list(SOURCES):
+            if source == 'comments':
+                if args.comments_cutoff_id is None:
+                    logger.warning("Skipping comments: pass --comments-cutoff-id to mark deleted comments")
+                    continue
+                run(conn, source, args.chunk_size, args.sleep, args.start_id, cutoff_id=args.comments_cutoff_id)
+            else:
+                run(conn, source, args.chunk_size, args.sleep, args.start_id, reconcile=args.reconcile)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())